@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from app.api.endpoints import predict, users, health
+from app.api.endpoints import predict, users, health, stream
 
 api_router = APIRouter()
 api_router.include_router(health.router, tags=["Default"])
 api_router.include_router(predict.router, prefix="/face", tags=["Face Recognition"])
-api_router.include_router(users.router, prefix="/users", tags=["User Management"])
\ No newline at end of file
+api_router.include_router(users.router, prefix="/users", tags=["User Management"])
+api_router.include_router(stream.router, prefix="/stream", tags=["Streaming"])
@@ -1,5 +1,11 @@
 from fastapi import APIRouter
 from app.services.ai_service import ai_service
+from app.services.batch_scheduler import inference_batcher
+from app.services.compute_pool import compute_pool
+from app.services.embedding_cache import embedding_cache
+from app.services.gallery_service import gallery_service
+from app.services.prediction_log_writer import prediction_log_writer
+from app.utils.preprocessing import detector_pool
 from loguru import logger
 
 router = APIRouter()
@@ -14,6 +20,13 @@ def health_check():
         "status": "healthy" if is_loaded else "degraded",
         "model_loaded": is_loaded,
         "device": str(session.get_providers()) if session else "None",
+        "model": ai_service.stats(),
+        "inference_batching": inference_batcher.stats(),
+        "compute_pool": compute_pool.stats(),
+        "detector_pool": detector_pool.stats(),
+        "gallery": gallery_service.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "prediction_log": prediction_log_writer.stats(),
     }
 
     if not is_loaded:
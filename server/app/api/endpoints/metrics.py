@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+
+from app.core.config import settings
+from app.core.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from app.db.session import engine
+from app.services.ai_service import ai_service
+from app.services.batch_scheduler import inference_batcher
+from app.services.compute_pool import compute_pool
+from app.services.embedding_cache import embedding_cache
+from app.services.gallery_service import gallery_service
+from app.services.prediction_log_writer import prediction_log_writer
+
+router = APIRouter()
+
+
+def _service_samples():
+    """Queue depths, pool usage and counters read from the services at scrape time."""
+    batching = inference_batcher.stats()
+    pool = compute_pool.stats()
+    cache = embedding_cache.stats()
+    log = prediction_log_writer.stats()
+    samples = [
+        ("face_model_loaded", "gauge", "1 if the embedding model session is loaded.", int(ai_service.session is not None)),
+        ("face_inference_queue_depth", "gauge", "Embedding requests waiting for the micro-batcher.", batching["queue_depth"]),
+        ("face_inference_batches_total", "counter", "ONNX runs dispatched by the micro-batcher.", batching["batches"]),
+        ("face_inference_items_total", "counter", "Faces embedded through the micro-batcher.", batching["items"]),
+        ("face_compute_pool_pending", "gauge", "Jobs running or queued on the compute pool.", pool["pending"]),
+        ("face_compute_pool_capacity", "gauge", "Compute pool workers plus queue slots.", pool["max_workers"] + pool["max_queue"]),
+        ("face_compute_pool_rejected_total", "counter", "Requests rejected with 503 because the compute pool was full.", pool["rejected"]),
+        ("face_gallery_size", "gauge", "Embeddings in the in-memory gallery index.", gallery_service.stats()["size"]),
+        ("face_embedding_cache_hits_total", "counter", "Query embedding cache hits.", cache["hits"]),
+        ("face_embedding_cache_misses_total", "counter", "Query embedding cache misses.", cache["misses"]),
+        ("face_prediction_log_queue_depth", "gauge", "Prediction log rows waiting to be written.", log["queue_depth"]),
+        ("face_prediction_log_sampled_out_total", "counter", "Prediction log rows skipped by busy-queue sampling.", log["sampled_out"]),
+        ("face_prediction_log_dropped_total", "counter", "Prediction log rows dropped because the queue was full.", log["dropped"]),
+    ]
+    db_pool = engine.pool
+    # Only queue pools track checkouts (NullPool / StaticPool do not)
+    if hasattr(db_pool, "checkedout"):
+        samples += [
+            ("db_pool_size", "gauge", "Configured DB connection pool size.", db_pool.size()),
+            ("db_pool_checked_out", "gauge", "DB connections currently in use.", db_pool.checkedout()),
+            ("db_pool_idle", "gauge", "DB connections idle in the pool.", db_pool.checkedin()),
+            ("db_pool_overflow", "gauge", "DB connections opened beyond the pool size.", max(0, db_pool.overflow())),
+        ]
+    return samples
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition: per-stage and per-route latency histograms plus service gauges."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(render_prometheus(_service_samples()), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,53 +1,116 @@
 # app/api/endpoints/predict.py
 import time
-import json
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import ValidationError
 from loguru import logger
 
+from app.core.metrics import stage
 from app.schemas.prediction import PredictionRequest, PredictionResponse
 from app.services.ai_service import ai_service
-from app.db.session import get_db
-from app.db.models import PredictionLog
+from app.services.compute_pool import compute_pool, ComputePoolBusy
+from app.services.prediction_log_writer import prediction_log_writer
+from app.utils.tensor_codec import (
+    DTYPE_HEADER, NPY_CONTENT_TYPE, SHAPE_HEADER, TENSOR_CONTENT_TYPE, decode_npy, decode_raw_tensor,
+)
 
 router = APIRouter()
 
-@router.post("/inference", response_model=PredictionResponse)
-async def predict(
-    request: PredictionRequest,
-    db: AsyncSession = Depends(get_db)
-):
+_TENSOR_BODY_DOC = {
+    "requestBody": {
+        "content": {
+            "application/json": {"schema": PredictionRequest.model_json_schema()},
+            TENSOR_CONTENT_TYPE: {
+                "schema": {"type": "string", "format": "binary"},
+                "description": f"Raw C-order tensor; {SHAPE_HEADER} (e.g. 1,3,112,112) and optional "
+                               f"{DTYPE_HEADER} (float32 | float16 | uint8) headers, request id in X-Request-ID",
+            },
+            NPY_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}, "description": ".npy file"},
+        },
+        "required": True,
+    },
+}
+
+
+async def _read_request(http_request: Request):
+    """Returns (request_id, input, input_source). Tensor bodies become read-only views over the body bytes."""
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in (TENSOR_CONTENT_TYPE, NPY_CONTENT_TYPE):
+        body = await http_request.body()
+        try:
+            if content_type == NPY_CONTENT_TYPE:
+                tensor = decode_npy(body)
+            else:
+                tensor = decode_raw_tensor(
+                    body, http_request.headers.get(SHAPE_HEADER), http_request.headers.get(DTYPE_HEADER)
+                )
+            ai_service.check_input(tensor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        request_id = http_request.headers.get("x-request-id") or uuid.uuid4().hex
+        return request_id, tensor, "api_tensor"
+
+    try:
+        request = PredictionRequest.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    if ai_service.input_uint8:
+        # JSON floats would be truncated into uint8 pixels
+        raise HTTPException(status_code=400, detail="Model takes uint8 NHWC input; send it as a binary tensor body")
+    return request.request_id, request.input_data, "api_request"
+
+
+@router.post("/inference", response_model=PredictionResponse, openapi_extra=_TENSOR_BODY_DOC)
+async def predict(http_request: Request):
+    """Raw ONNX inference. Accepts the JSON `PredictionRequest`, or a binary tensor body
+    (`application/octet-stream` + shape/dtype headers, or `application/x-npy`).
+    With `Accept: application/octet-stream` the embeddings come back as raw float32 bytes."""
     if ai_service.session is None:
         logger.error("Inference requested while model not loaded")
         raise HTTPException(status_code=503, detail="Model is not loaded.")
 
+    with stage("upload_read"):
+        request_id, input_data, input_source = await _read_request(http_request)
     start_time = time.perf_counter()
-    
+
     try:
-        result_vector = ai_service.inference(request.input_data)
+        if isinstance(input_data, np.ndarray):
+            result = await compute_pool.run(ai_service.inference_batch, input_data)
+        else:
+            result = await compute_pool.run(ai_service.inference, input_data)
+    except ComputePoolBusy:
+        raise
     except Exception as e:
         logger.exception(f"Inference failed: {e}")
         raise HTTPException(status_code=500, detail="Inference failed")
-        
+
     execution_time = (time.perf_counter() - start_time) * 1000
 
-    try:
-        log_entry = PredictionLog(
-            request_id=request.request_id,
-            input_source="api_request",
-            result_json=json.dumps(result_vector),
-            execution_time=execution_time
+    prediction_log_writer.submit(request_id, result, execution_time, input_source=input_source)
+    logger.info(f"Inference done: {request_id} | {execution_time:.2f}ms")
+
+    if TENSOR_CONTENT_TYPE in http_request.headers.get("accept", ""):
+        embeddings = np.ascontiguousarray(result, dtype="<f4")
+        return Response(
+            content=embeddings.tobytes(),
+            media_type=TENSOR_CONTENT_TYPE,
+            headers={
+                SHAPE_HEADER: ",".join(str(d) for d in embeddings.shape),
+                DTYPE_HEADER: "float32",
+                "X-Request-ID": request_id,
+                "X-Execution-Time-Ms": f"{execution_time:.3f}",
+            },
         )
-        db.add(log_entry)
-        await db.commit()
-        logger.info(f"Inference done: {request.request_id} | {execution_time:.2f}ms")
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Prediction log save failed: {e}")
-    
+
+    if isinstance(result, np.ndarray):
+        prediction = result[0].tolist()
+    else:
+        prediction = result[0] if isinstance(result[0], list) else result
     return PredictionResponse(
-        request_id=request.request_id,
-        prediction=result_vector[0] if isinstance(result_vector[0], list) else result_vector,
+        request_id=request_id,
+        prediction=prediction,
         execution_time=execution_time
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.websockets import WebSocketState
+from loguru import logger
+
+from app.api.endpoints.users import _load_users_by_id, _user_with_face_url
+from app.core.config import settings
+from app.core.security import decode_access_token
+from app.db.session import AsyncSessionLocal
+from app.services.ai_service import ai_service
+from app.services.compute_pool import compute_pool
+from app.services.gallery_service import gallery_service
+from app.utils.preprocessing import decode_image, detect_faces, pre_process_faces
+from app.utils.tracking import IoUTracker, Track
+
+router = APIRouter()
+
+
+def _decode_and_detect(contents: bytes, max_faces: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode + YuNet in one compute-pool hop; returns (image, detections)."""
+    image = decode_image(contents)
+    faces = detect_faces(image)
+    if faces is None:
+        raise RuntimeError("Face detector is not available")
+    return image, faces[:max_faces]
+
+
+class RecognitionStream:
+    """One /stream/recognize connection.
+
+    A receiver task keeps only the newest unprocessed frame (older ones are counted as dropped),
+    so a client sending faster than we process sees fresh results instead of a growing backlog.
+    YuNet runs every STREAM_DETECT_EVERY_N_FRAMES processed frames; IoU tracking carries faces
+    (and their identities) across the frames in between, which are not even decoded. A track is
+    re-embedded only when IoUTracker says it is due (new, better detection score, or refresh
+    interval elapsed), and its identity comes from the smoothed per-track embedding.
+
+    Matched users' profiles are cached per connection. An entry is re-read from the DB whenever a
+    track switches to that user, and on a re-embed once it is older than the gallery sync
+    interval, so edits and deletions made elsewhere show up within about one refresh.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.tracker = IoUTracker(
+            settings.STREAM_IOU_THRESHOLD,
+            settings.STREAM_TRACK_MAX_MISSES,
+            refresh_seconds=settings.STREAM_REEMBED_INTERVAL_SECONDS,
+            score_gain=settings.STREAM_REEMBED_SCORE_GAIN,
+            smoothing=settings.STREAM_IDENTITY_SMOOTHING,
+        )
+        self.detect_every = max(1, settings.STREAM_DETECT_EVERY_N_FRAMES)
+        self._latest: Optional[Tuple[int, bytes]] = None
+        self._frame_ready = asyncio.Event()
+        self._closed = False
+        # user_id -> (monotonic fetch time, user payload)
+        self._users: Dict[int, Tuple[float, dict]] = {}
+        self.received = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.processed = 0
+        self.face_frames = 0
+        self.embedded = 0
+        self._since_detection = 0
+
+    async def run(self):
+        receiver = asyncio.create_task(self._receive())
+        try:
+            await self._send({"type": "ready", "detect_every": self.detect_every})
+            await self._process()
+        finally:
+            receiver.cancel()
+            logger.info(
+                f"Stream closed: received={self.received} processed={self.processed} "
+                f"dropped={self.dropped} rejected={self.rejected} "
+                f"embedded={self.embedded}/{self.face_frames} face-frames"
+            )
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                contents = message.get("bytes")
+                if contents is None:
+                    continue  # text frames carry no image
+                self.received += 1
+                if len(contents) > settings.STREAM_MAX_FRAME_BYTES:
+                    self.rejected += 1
+                    continue
+                if self._latest is not None:
+                    self.dropped += 1
+                self._latest = (self.received, contents)
+                self._frame_ready.set()
+        finally:
+            self._closed = True
+            self._frame_ready.set()
+
+    async def _process(self):
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            if self._latest is None:
+                if self._closed:
+                    return
+                continue
+            seq, contents = self._latest
+            self._latest = None
+            await self._handle_frame(seq, contents)
+
+    async def _handle_frame(self, seq: int, contents: bytes):
+        self.processed += 1
+        detect = not self.tracker.tracks or self._since_detection + 1 >= self.detect_every
+        matches: List[Track] = []
+        if detect:
+            self._since_detection = 0
+            try:
+                image, faces = await compute_pool.run(
+                    _decode_and_detect, contents, settings.MULTI_FACE_MAX_FACES, block=True
+                )
+            except ValueError as e:
+                await self._send({"type": "error", "frame": seq, "detail": str(e)})
+                return
+            self.tracker.update(faces)
+            pending = self.tracker.due_for_embedding()
+            if pending:
+                matches = await self._identify(image, pending)
+        else:
+            self._since_detection += 1
+
+        visible = [t for t in self.tracker.tracks if t.misses == 0]
+        self.face_frames += len(visible)
+        for track in matches:
+            await self._send({"type": "match", "frame": seq, **self._track_payload(track)})
+        await self._send({
+            "type": "frame",
+            "frame": seq,
+            "detected": detect,
+            "dropped": self.dropped,
+            "faces": [self._track_payload(t) for t in visible],
+        })
+
+    async def _identify(self, image: np.ndarray, tracks: List[Track]) -> List[Track]:
+        """Embeds the given tracks in one batch, folds the results into their smoothed embeddings and
+        searches the gallery with those; returns tracks that became matched or changed identity."""
+        batch = await compute_pool.run(pre_process_faces, image, np.stack([t.face for t in tracks]), block=True)
+        embeddings = await compute_pool.run(ai_service.inference_batch, batch, block=True)
+        self.embedded += len(tracks)
+        smoothed = np.stack([self.tracker.observe(t, e) for t, e in zip(tracks, embeddings)])
+        results = await compute_pool.run(gallery_service.search_batch, smoothed, 1, block=True)
+
+        newly_matched = []
+        for track, matches in zip(tracks, results):
+            if not matches:
+                continue
+            previous = track.user_id if track.matched else None
+            track.user_id, track.similarity = matches[0]
+            track.matched = track.similarity >= settings.FACE_MATCH_THRESHOLD
+            if track.matched and track.user_id != previous:
+                newly_matched.append(track)
+
+        await self._refresh_users(tracks, newly_matched)
+        return newly_matched
+
+    async def _refresh_users(self, tracks: List[Track], newly_matched: List[Track]):
+        """Re-reads the profiles of users whose track just switched to them or whose cached entry is
+        older than GALLERY_SYNC_INTERVAL_SECONDS, and drops entries no live track points at."""
+        now = time.monotonic()
+        stale = {t.user_id for t in newly_matched}
+        stale.update(
+            t.user_id for t in tracks
+            if t.matched and now - self._users.get(t.user_id, (float("-inf"), None))[0] >= settings.GALLERY_SYNC_INTERVAL_SECONDS
+        )
+        live = {t.user_id for t in self.tracker.tracks if t.matched}
+        for user_id in [u for u in self._users if u not in live]:
+            del self._users[user_id]
+        if not stale:
+            return
+        async with AsyncSessionLocal() as db:
+            users_by_id = await _load_users_by_id(db, list(stale))
+        for user_id in stale:
+            self._users[user_id] = (now, _user_with_face_url(users_by_id.get(user_id)))
+
+    def _track_payload(self, track: Track) -> dict:
+        return {
+            "track_id": track.track_id,
+            "box": track.box,
+            "detection_score": round(track.score, 4),
+            "search_result": track.matched,
+            "user": self._users.get(track.user_id, (0.0, None))[1] if track.matched else None,
+            "similarity": round(track.similarity, 4),
+        }
+
+    async def _send(self, event: dict):
+        await self.websocket.send_json(event)
+
+
+@router.websocket("/recognize")
+async def recognize_stream(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="JWT access token (browsers cannot set headers on WebSockets)"),
+):
+    """Streams binary JPEG frames in, pushes JSON `ready` / `frame` / `match` / `error` events out.
+    Authenticated once at connect, via `?token=` or an `Authorization: Bearer` header."""
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    payload = decode_access_token(token) if token else None
+    if not payload or not payload.get("sub"):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    logger.info(f"Stream opened by {payload['sub']}")
+    try:
+        await RecognitionStream(websocket).run()
+    except WebSocketDisconnect:
+        pass
+    except RuntimeError as e:
+        # Detector or model unavailable
+        logger.warning(f"Stream aborted: {e}")
+        # The error may have come from sending to a socket the client already closed
+        if websocket.client_state == WebSocketState.CONNECTED and websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason=str(e)[:120])
@@ -1,7 +1,10 @@
+import asyncio
 import json
 import uuid
 import cv2
-from typing import List
+import numpy as np
+from loguru import logger
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
 from starlette.responses import StreamingResponse, FileResponse
@@ -12,14 +15,47 @@ from app.db.session import get_db
 from app.db.models import User
 from app.schemas.user import UserResponse, UserUpdate
 from app.services.ai_service import ai_service
-from app.utils.preprocessing import read_image_file, pre_process
-from app.utils.recognition import find_best_match
+from app.services.batch_scheduler import inference_batcher
+from app.services.compute_pool import compute_pool, ComputePoolBusy
+from app.services.embedding_cache import embedding_cache
+from app.services.gallery_service import gallery_service, record_gallery_changes
+from app.utils.preprocessing import decode_and_pre_process, decode_and_pre_process_all
+from app.utils.recognition import encode_embedding
 from app.utils.face_image_storage import save_face_image, save_face_preprocessed_image, delete_face_image_if_exists, get_face_image_path
 from app.core.config import settings
+from app.core.metrics import stage
 from app.api.endpoints.auth import get_current_user
 
 router = APIRouter()
 
+# Stays well under SQLite's bound-parameter limit for IN (...) lookups.
+BULK_NAME_LOOKUP_CHUNK = 500
+
+
+def _delete_face_images(face_image_path: str | None, face_preprocessed_path: str | None):
+    delete_face_image_if_exists(face_image_path)
+    delete_face_image_if_exists(face_preprocessed_path)
+
+
+def _delete_saved_face_images(save: asyncio.Future):
+    """Done-callback for an abandoned `_save_face_images` job: removes whatever it wrote."""
+    if not save.cancelled() and save.exception() is None:
+        _delete_face_images(*save.result())
+
+
+def _save_face_images(image, resized_bgr, identity_id: str) -> Tuple[str, str]:
+    """Encodes and writes the original and preprocessed face JPEGs; removes partial output on failure."""
+    face_image_path: str | None = None
+    try:
+        _, buf = cv2.imencode(".jpg", image)
+        face_image_path = save_face_image(buf.tobytes(), identity_id, "jpg")
+        _, prep_buf = cv2.imencode(".jpg", resized_bgr)
+        face_preprocessed_path = save_face_preprocessed_image(prep_buf.tobytes(), identity_id)
+    except Exception:
+        delete_face_image_if_exists(face_image_path)
+        raise
+    return face_image_path, face_preprocessed_path
+
 @router.post("/register", response_model=UserResponse)
 async def register_user(
     name: str = Form(..., description="Display name for the user"),
@@ -39,44 +75,63 @@ async def register_user(
     face_image_path: str | None = None
     face_preprocessed_path: str | None = None
     try:
-        image = await read_image_file(file)
-        processed_tensor, resized_bgr = pre_process(image, return_resized=True)
-        embedding_list = ai_service.inference(processed_tensor)
-        embedding_json = json.dumps(embedding_list)
-        _, buf = cv2.imencode(".jpg", image)
-        face_image_path = save_face_image(buf.tobytes(), identity_id, "jpg")
-        _, prep_buf = cv2.imencode(".jpg", resized_bgr)
-        face_preprocessed_path = save_face_preprocessed_image(prep_buf.tobytes(), identity_id)
+        contents = await file.read()
+        image, processed_tensor, resized_bgr = await compute_pool.run(decode_and_pre_process, contents, True)
+        # Images are still decoded for saving; a cache hit only skips inference
+        cache_key = embedding_cache.key(contents) if embedding_cache.enabled else None
+        embedding = embedding_cache.get(cache_key) if cache_key else None
+        if embedding is None:
+            embedding = await inference_batcher.embed(processed_tensor)
+            if cache_key:
+                embedding_cache.put(cache_key, embedding)
+        embedding_blob = encode_embedding(embedding, settings.EMBEDDING_STORAGE_DTYPE)
+        face_image_path, face_preprocessed_path = await compute_pool.run(
+            _save_face_images, image, resized_bgr, identity_id, block=True
+        )
+    except ComputePoolBusy:
+        raise
     except Exception as e:
-        delete_face_image_if_exists(face_image_path)
-        delete_face_image_if_exists(face_preprocessed_path)
+        _delete_face_images(face_image_path, face_preprocessed_path)
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
         new_user = User(
             name=name,
             identity_id=identity_id,
-            face_embedding=embedding_json,
+            face_embedding=embedding_blob,
             face_image_path=face_image_path,
             face_preprocessed_path=face_preprocessed_path,
             is_active=True
         )
         db.add(new_user)
+        await db.flush()
+        record_gallery_changes(db, "add", [new_user.id])
         await db.commit()
-        await db.refresh(new_user)
-        return new_user
     except Exception as e:
-        delete_face_image_if_exists(face_image_path)
-        delete_face_image_if_exists(face_preprocessed_path)
+        await db.rollback()
+        _delete_face_images(face_image_path, face_preprocessed_path)
         raise HTTPException(status_code=500, detail=str(e))
 
+    # Committed: the row owns its images from here on. A failed gallery add is repaired by the
+    # change-log sync (the change row above) rather than failing a registration that is stored
+    await db.refresh(new_user)
+    try:
+        gallery_service.add(new_user.id, embedding)
+    except Exception as e:
+        logger.error(f"Gallery add failed for committed user {new_user.id}: {e}")
+    return new_user
+
 @router.post("/register/bulk")
 async def register_bulk_users(
     request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Bulk-registers users from uploaded files; streams progress via SSE. Uses raw Request to bypass Starlette default max_files=1000."""
+    """Bulk-registers users from uploaded files; streams progress via SSE. Uses raw Request to bypass Starlette default max_files=1000.
+
+    Pipelined: one batched duplicate-name lookup, up to BULK_REGISTER_CONCURRENCY items in flight
+    (pool decode/detect, batched inference, pool image writes), INSERTs committed every
+    BULK_REGISTER_COMMIT_SIZE rows. Progress events are still emitted in upload order."""
     form = await request.form(max_files=10000, max_fields=10000)
     files: List[UploadFile] = [v for k, v in form.multi_items() if k == "files"]
     names: List[str] = [v for k, v in form.multi_items() if k == "names"]
@@ -85,67 +140,139 @@ async def register_bulk_users(
         await form.close()
         raise HTTPException(status_code=400, detail="파일 수와 이름 수가 일치하지 않습니다.")
 
+    async def prepare(file: UploadFile, name: str) -> Tuple[User, np.ndarray]:
+        """Decode/detect on the pool, embed via the batcher (concurrent items share one ONNX run), persist images."""
+        identity_id = str(uuid.uuid4())
+        contents = await file.read()
+        image, processed_tensor, resized_bgr = await compute_pool.run(
+            decode_and_pre_process, contents, True, block=True
+        )
+        embedding = await inference_batcher.embed(processed_tensor)
+        save = asyncio.ensure_future(
+            compute_pool.run(_save_face_images, image, resized_bgr, identity_id, block=True)
+        )
+        try:
+            face_image_path, face_preprocessed_path = await asyncio.shield(save)
+        except asyncio.CancelledError:
+            # The write finishes on its worker thread anyway; remove the files once it does
+            save.add_done_callback(_delete_saved_face_images)
+            raise
+        new_user = User(
+            name=name,
+            identity_id=identity_id,
+            face_embedding=encode_embedding(embedding, settings.EMBEDDING_STORAGE_DTYPE),
+            face_image_path=face_image_path,
+            face_preprocessed_path=face_preprocessed_path,
+            is_active=True
+        )
+        return new_user, embedding
+
     async def generate():
         total = len(files)
         success_count = 0
         failed_folders = []
-
-        for i, (file, name) in enumerate(zip(files, names)):
-            status = "success"
-            reason = None
-
-            existing_user_result = await db.execute(select(User).where(User.name == name))
-            if existing_user_result.scalars().first():
-                status = "failed"
-                reason = "Already registered"
-                failed_folders.append({"folder": name, "reason": reason})
-            else:
-                face_image_path: str | None = None
-                face_preprocessed_path: str | None = None
-                identity_id = str(uuid.uuid4())
+        # Prepared rows not yet committed, with their progress events; events are held back (in
+        # upload order) until the chunk commits, so "success" is only reported for stored rows
+        pending: List[Tuple[User, np.ndarray, dict]] = []
+        events: List[dict] = []
+
+        async def flush():
+            """INSERTs the pending chunk in one commit; on failure drops its images and reports the rows as failed."""
+            nonlocal success_count
+            if not pending:
+                return
+            # Taken off `pending` first: if the request is cancelled mid-commit the rows may be
+            # stored, so the disconnect cleanup must not delete their images
+            chunk = pending[:]
+            pending.clear()
+            try:
+                db.add_all([u for u, _, _ in chunk])
+                await db.flush()
+                record_gallery_changes(db, "add", [u.id for u, _, _ in chunk])
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Bulk register chunk commit failed ({len(chunk)} rows): {e}")
+                for new_user, _, event in chunk:
+                    _delete_face_images(new_user.face_image_path, new_user.face_preprocessed_path)
+                    failed_folders.append({"folder": new_user.name, "reason": str(e)})
+                    event.update(status="failed", reason=str(e))
+                return
+            success_count += len(chunk)
+            # Committed: a gallery failure here is repaired by the change-log sync, not by deleting images
+            for new_user, embedding, _ in chunk:
                 try:
-                    image = await read_image_file(file)
-                    processed_tensor, resized_bgr = pre_process(image, return_resized=True)
-                    embedding_list = ai_service.inference(processed_tensor)
-                    embedding_json = json.dumps(embedding_list)
-                    _, buf = cv2.imencode(".jpg", image)
-                    face_image_path = save_face_image(buf.tobytes(), identity_id, "jpg")
-                    _, prep_buf = cv2.imencode(".jpg", resized_bgr)
-                    face_preprocessed_path = save_face_preprocessed_image(prep_buf.tobytes(), identity_id)
-
-                    new_user = User(
-                        name=name,
-                        identity_id=identity_id,
-                        face_embedding=embedding_json,
-                        face_image_path=face_image_path,
-                        face_preprocessed_path=face_preprocessed_path,
-                        is_active=True
-                    )
-                    db.add(new_user)
-                    success_count += 1
-
+                    gallery_service.add(new_user.id, embedding)
                 except Exception as e:
-                    delete_face_image_if_exists(face_image_path)
-                    delete_face_image_if_exists(face_preprocessed_path)
-                    status = "failed"
-                    reason = str(e)
-                    failed_folders.append({"folder": name, "reason": reason})
-
-            progress_event = {
-                "type": "progress",
-                "current": i + 1,
-                "total": total,
-                "name": name,
-                "status": status,
-            }
-            if reason:
-                progress_event["reason"] = reason
-            yield f"data: {json.dumps(progress_event)}\n\n"
-
-        if success_count > 0:
-            await db.commit()
-
-        await form.close()
+                    logger.error(f"Gallery add failed for committed user {new_user.id}: {e}")
+
+        existing_names = set()
+        unique_names = list(set(names))
+        for start in range(0, len(unique_names), BULK_NAME_LOOKUP_CHUNK):
+            chunk = unique_names[start:start + BULK_NAME_LOOKUP_CHUNK]
+            result = await db.execute(select(User.name).where(User.name.in_(chunk)))
+            existing_names.update(result.scalars().all())
+
+        items = list(zip(files, names))
+        skip = []
+        seen = set(existing_names)
+        for _, name in items:
+            skip.append(name in seen)
+            seen.add(name)
+
+        tasks = {}
+        next_to_start = 0
+
+        def schedule(upto: int):
+            nonlocal next_to_start
+            while next_to_start < min(upto, total):
+                if not skip[next_to_start]:
+                    file, name = items[next_to_start]
+                    tasks[next_to_start] = asyncio.create_task(prepare(file, name))
+                next_to_start += 1
+
+        try:
+            for i, (file, name) in enumerate(items):
+                schedule(i + settings.BULK_REGISTER_CONCURRENCY)
+                progress_event = {
+                    "type": "progress",
+                    "current": i + 1,
+                    "total": total,
+                    "name": name,
+                    "status": "success",
+                }
+                events.append(progress_event)
+
+                if skip[i]:
+                    progress_event.update(status="failed", reason="Already registered")
+                    failed_folders.append({"folder": name, "reason": "Already registered"})
+                else:
+                    try:
+                        new_user, embedding = await tasks.pop(i)
+                        pending.append((new_user, embedding, progress_event))
+                    except Exception as e:
+                        progress_event.update(status="failed", reason=str(e))
+                        failed_folders.append({"folder": name, "reason": str(e)})
+
+                if len(pending) >= settings.BULK_REGISTER_COMMIT_SIZE or i + 1 == total:
+                    await flush()
+                if not pending:
+                    for event in events:
+                        yield f"data: {json.dumps(event)}\n\n"
+                    events.clear()
+        finally:
+            # Client gone or generator closed early: nothing below was committed, so remove the
+            # images of prepared-but-unflushed rows and of prepare tasks that already finished
+            for new_user, _, _ in pending:
+                _delete_face_images(new_user.face_image_path, new_user.face_preprocessed_path)
+            pending.clear()
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    new_user, _ = task.result()
+                    _delete_face_images(new_user.face_image_path, new_user.face_preprocessed_path)
+            await form.close()
 
         complete_event = {
             "type": "complete",
@@ -162,43 +289,216 @@ async def register_bulk_users(
         headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
     )
 
+def _user_with_face_url(u: User | None):
+    if not u:
+        return {"name": None, "identity_id": None, "face_image_url": None}
+    face_url = f"/api/v1/users/face-image/{u.identity_id}" if u.face_image_path else None
+    return {"name": u.name, "identity_id": u.identity_id, "face_image_url": face_url}
+
+
+async def _load_users_by_id(db: AsyncSession, user_ids: List[int]) -> Dict[int, User]:
+    """Fetches the matched users in one query; gallery ids whose rows are gone are simply absent."""
+    if not user_ids:
+        return {}
+    with stage("db_users"):
+        result = await db.execute(select(User).where(User.id.in_(user_ids)))
+        return {u.id: u for u in result.scalars().all()}
+
+
+def _search_response(
+    matches: List[Tuple[int, float]],
+    users_by_id: Dict[int, User],
+    with_candidates: bool = False,
+    min_similarity: Optional[float] = None,
+):
+    """Builds the /search response for one query: best match fields, plus a ranked `candidates` list when requested."""
+    best_user_id, max_similarity = matches[0]
+    best_user = users_by_id.get(best_user_id)
+
+    if best_user and max_similarity >= settings.FACE_MATCH_THRESHOLD:
+        response = {
+            "search_result": True,
+            "user": _user_with_face_url(best_user),
+            "similarity": round(max_similarity, 4)
+        }
+    else:
+        response = {
+            "search_result": False,
+            "user": _user_with_face_url(best_user),
+            "message": "No matching user found or similarity is too low",
+            "similarity": round(max_similarity, 4) if max_similarity is not None else 0.0
+        }
+
+    if with_candidates:
+        # Ranked after filtering, so ranks stay 1..n without gaps
+        kept = [
+            (user_id, similarity)
+            for user_id, similarity in matches
+            if user_id in users_by_id and (min_similarity is None or similarity >= min_similarity)
+        ]
+        response["candidates"] = [
+            {
+                "rank": rank,
+                **_user_with_face_url(users_by_id[user_id]),
+                "similarity": round(similarity, 4),
+                "is_match": similarity >= settings.FACE_MATCH_THRESHOLD,
+            }
+            for rank, (user_id, similarity) in enumerate(kept, start=1)
+        ]
+    return response
+
+
+async def _embed_upload(contents: bytes) -> np.ndarray:
+    """Embedding of a single-face upload; served from `embedding_cache` when the same bytes were seen recently."""
+    cache_key = embedding_cache.key(contents) if embedding_cache.enabled else None
+    embedding = embedding_cache.get(cache_key) if cache_key else None
+    if embedding is not None:
+        return embedding
+    _, processed_tensor = await compute_pool.run(decode_and_pre_process, contents)
+    embedding = await inference_batcher.embed(processed_tensor)
+    if cache_key:
+        embedding_cache.put(cache_key, embedding)
+    return embedding
+
+
 @router.post("/search")
 async def search_user(
     file: UploadFile = File(..., description="Face image file"),
+    top_k: int = Form(1, ge=1, le=100, description="Number of ranked candidates to return"),
+    min_similarity: Optional[float] = Form(None, ge=-1.0, le=1.0, description="Omit candidates below this similarity"),
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
+    """Identifies the uploaded face. With defaults returns the single best match; with top_k > 1 or
+    min_similarity also returns a ranked `candidates` list for reviewing near-misses."""
+    with stage("upload_read"):
+        contents = await file.read()
+    current_embedding = await _embed_upload(contents)
+
+    matches = await compute_pool.run(gallery_service.search, current_embedding, top_k, block=True)
+    if not matches:
+        raise HTTPException(status_code=404, detail="No active users found")
 
-    image = await read_image_file(file)
-    processed_tensor = pre_process(image)
-    current_embedding = ai_service.inference(processed_tensor)
-    
-    result = await db.execute(select(User).where(User.is_active == True))
-    users = list(result.scalars().all())
+    with_candidates = top_k > 1 or min_similarity is not None
+    users_by_id = await _load_users_by_id(
+        db, [user_id for user_id, _ in matches] if with_candidates else [matches[0][0]]
+    )
+    return _search_response(matches, users_by_id, with_candidates, min_similarity)
 
-    if not users:
+
+@router.post("/search/batch")
+async def search_users_batch(
+    files: List[UploadFile] = File(..., description="Face image files"),
+    top_k: int = Form(1, ge=1, le=100, description="Number of ranked candidates to return per image"),
+    min_similarity: Optional[float] = Form(None, ge=-1.0, le=1.0, description="Omit candidates below this similarity"),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Identifies N uploaded faces at once: one batched ONNX run and one matrix-matrix product against the gallery.
+    Each result has the /search response shape plus `filename`; undecodable images get an `error` instead."""
+    if len(files) > settings.SEARCH_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images: {len(files)} (max {settings.SEARCH_BATCH_MAX_IMAGES})",
+        )
+
+    with stage("upload_read"):
+        contents = [await f.read() for f in files]
+    cache_keys = [embedding_cache.key(c) for c in contents] if embedding_cache.enabled else [None] * len(files)
+    cached = [embedding_cache.get(key) if key else None for key in cache_keys]
+    misses = [i for i, embedding in enumerate(cached) if embedding is None]
+
+    if misses:
+        compute_pool.check_capacity()
+    prepared = await asyncio.gather(
+        *[compute_pool.run(decode_and_pre_process, contents[i], block=True) for i in misses],
+        return_exceptions=True,
+    )
+    results = [None] * len(files)
+    tensors = {}
+    for i, p in zip(misses, prepared):
+        if isinstance(p, BaseException):
+            results[i] = {"filename": files[i].filename, "error": str(p)}
+        else:
+            tensors[i] = p[1]
+    if tensors:
+        batch = np.concatenate(list(tensors.values()), axis=0)
+        fresh = await compute_pool.run(ai_service.inference_batch, batch, block=True)
+        for i, embedding in zip(tensors, fresh):
+            cached[i] = embedding
+            if cache_keys[i]:
+                embedding_cache.put(cache_keys[i], embedding)
+
+    ok_rows = [i for i, embedding in enumerate(cached) if embedding is not None]
+    if not ok_rows:
+        return {"results": results}
+
+    embeddings = np.stack([cached[i] for i in ok_rows])
+    matches_per_image = await compute_pool.run(gallery_service.search_batch, embeddings, top_k, block=True)
+    if not matches_per_image[0]:
         raise HTTPException(status_code=404, detail="No active users found")
-    
-    best_user, max_similarity = find_best_match(current_embedding, users)
 
-    def _user_with_face_url(u: User | None):
-        if not u:
-            return {"name": None, "identity_id": None, "face_image_url": None}
-        face_url = f"/api/v1/users/face-image/{u.identity_id}" if u.face_image_path else None
-        return {"name": u.name, "identity_id": u.identity_id, "face_image_url": face_url}
+    with_candidates = top_k > 1 or min_similarity is not None
+    wanted_ids = {
+        user_id
+        for matches in matches_per_image
+        for user_id, _ in (matches if with_candidates else matches[:1])
+    }
+    users_by_id = await _load_users_by_id(db, list(wanted_ids))
 
-    if best_user and max_similarity >= settings.FACE_MATCH_THRESHOLD:
-        return {
-            "search_result": True,
-            "user": _user_with_face_url(best_user),
-            "similarity": round(max_similarity, 4)
+    for row, matches in zip(ok_rows, matches_per_image):
+        results[row] = {
+            "filename": files[row].filename,
+            **_search_response(matches, users_by_id, with_candidates, min_similarity),
         }
+    return {"results": results}
+
+
+@router.post("/search/faces")
+async def search_all_faces(
+    file: UploadFile = File(..., description="Image that may contain several faces (group photo, camera frame)"),
+    top_k: int = Form(1, ge=1, le=100, description="Number of ranked candidates to return per face"),
+    min_similarity: Optional[float] = Form(None, ge=-1.0, le=1.0, description="Omit candidates below this similarity"),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Identifies every detected face in one image. All faces are embedded in one batched ONNX run;
+    each entry carries its bounding box and detection score plus the /search response fields."""
+    with stage("upload_read"):
+        contents = await file.read()
+    try:
+        batch, faces = await compute_pool.run(decode_and_pre_process_all, contents, settings.MULTI_FACE_MAX_FACES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if len(faces) == 0:
+        return {"face_count": 0, "faces": []}
+
+    embeddings = await compute_pool.run(ai_service.inference_batch, batch, block=True)
+    matches_per_face = await compute_pool.run(gallery_service.search_batch, embeddings, top_k, block=True)
+    if not matches_per_face[0]:
+        raise HTTPException(status_code=404, detail="No active users found")
+
+    with_candidates = top_k > 1 or min_similarity is not None
+    wanted_ids = {
+        user_id
+        for matches in matches_per_face
+        for user_id, _ in (matches if with_candidates else matches[:1])
+    }
+    users_by_id = await _load_users_by_id(db, list(wanted_ids))
 
     return {
-        "search_result": False,
-        "user": _user_with_face_url(best_user),
-        "message": "No matching user found or similarity is too low",
-        "similarity": round(max_similarity, 4) if max_similarity is not None else 0.0
+        "face_count": len(faces),
+        "faces": [
+            {
+                "box": [int(v) for v in face[:4]],
+                "detection_score": round(float(face[-1]), 4),
+                **_search_response(matches, users_by_id, with_candidates, min_similarity),
+            }
+            for face, matches in zip(faces, matches_per_face)
+        ],
     }
 
 
@@ -274,9 +574,17 @@ async def update_user(
     update_data = user_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(user, key, value)
+    if "is_active" in update_data:
+        record_gallery_changes(db, "activate" if user.is_active else "deactivate", [user.id])
 
     await db.commit()
     await db.refresh(user)
+
+    if "is_active" in update_data:
+        if user.is_active:
+            gallery_service.add(user.id, user.face_embedding)
+        else:
+            gallery_service.remove(user.id)
     return user
 
 @router.delete("/all", status_code=200)
@@ -291,7 +599,9 @@ async def delete_all_users(
         delete_face_image_if_exists(u.face_image_path)
         delete_face_image_if_exists(u.face_preprocessed_path)
     await db.execute(delete(User))
+    record_gallery_changes(db, "clear", [None])
     await db.commit()
+    gallery_service.clear()
     return {
         "message": f"Successfully deleted {len(users)} users"
     }
@@ -311,5 +621,7 @@ async def delete_user(
     delete_face_image_if_exists(user.face_image_path)
     delete_face_image_if_exists(user.face_preprocessed_path)
     await db.delete(user)
+    record_gallery_changes(db, "remove", [user_id])
     await db.commit()
+    gallery_service.remove(user_id)
     return {"message": "User deleted successfully"}
\ No newline at end of file
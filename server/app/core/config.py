@@ -1,15 +1,115 @@
+from typing import List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     MODEL_PATH: str
+    # "float32" serves MODEL_PATH; "int8" serves the statically quantized variant from scripts/quantize_int8.py
+    MODEL_PRECISION: str = "float32"
+    # INT8 model location (empty: <MODEL_PATH without .onnx>.int8.onnx)
+    INT8_MODEL_PATH: str = ""
 
     DATABASE_URL: str
 
     FACE_MATCH_THRESHOLD: float = 0.70
     FACE_IMAGE_DIR: str = "face_images"
+    # "float32" | "float16" | "int8" (int8 stores a per-vector scale)
+    EMBEDDING_STORAGE_DTYPE: str = "float32"
     DETECTION_MODEL_PATH: str = "app/resources/face_detection_yunet_2023mar.onnx"
     DETECTION_SCORE_THRESHOLD: float = 0.9
     DETECTION_NMS_THRESHOLD: float = 0.3
+    # Run YuNet on a copy capped at this longest side (0: cap at the largest bucket)
+    DETECTION_MAX_SIDE: int = 640
+    # Square detector input sizes; images are letterboxed into the smallest that fits
+    DETECTION_INPUT_BUCKETS: List[int] = [160, 320, 480, 640]
+    # Decode JPEGs at 1/2..1/8 scale while the longest side stays >= this (0: always full decode)
+    DECODE_MAX_SIDE: int = 0
+    # Warp faces onto the ArcFace template using YuNet landmarks (False: box crop + resize).
+    # Off by default: stored embeddings were enrolled from box crops, and aligned queries do not
+    # match them as well; only enable on an empty gallery or after re-registering every user
+    FACE_ALIGNMENT_ENABLED: bool = False
+
+    # Micro-batching of concurrent embedding requests (app/services/batch_scheduler.py)
+    INFERENCE_BATCHING_ENABLED: bool = True
+    INFERENCE_BATCH_WINDOW_MS: float = 2.0
+    INFERENCE_MAX_BATCH_SIZE: int = 32
+
+    # ONNX Runtime session (app/services/ai_service.py). Level: "disable" | "basic" | "extended" | "all".
+    # Thread counts of 0 keep ORT's defaults; with COMPUTE_POOL_WORKERS concurrent runs, keep
+    # workers x intra-op threads <= cores
+    ORT_GRAPH_OPTIMIZATION_LEVEL: str = "all"
+    ORT_INTRA_OP_THREADS: int = 0
+    ORT_INTER_OP_THREADS: int = 0
+    ORT_EXECUTION_MODE: str = "sequential"
+    # Save the optimized graph here and load it directly on later starts (empty: optimize on every start)
+    ORT_OPTIMIZED_MODEL_DIR: str = ""
+    # Batch sizes run once at startup (empty: no warm-up); fixed-batch models warm up at their own size
+    ORT_WARMUP_BATCH_SIZES: List[int] = [1, 8, 32]
+
+    # Thread pool for decode / detection / inference (app/services/compute_pool.py)
+    COMPUTE_POOL_WORKERS: int = 4
+    COMPUTE_POOL_QUEUE_SIZE: int = 64
+    COMPUTE_POOL_RETRY_AFTER_SECONDS: int = 1
+
+    # Gallery search backend: "exact" (full scan) | "ivf" (k-means inverted lists) | "pq" (product-quantized codes)
+    SEARCH_BACKEND: str = "exact"
+    # Optional .npz path the gallery index is saved to / restored from (keeps the trained IVF quantizer)
+    SEARCH_INDEX_PATH: str = ""
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 32
+    # PQ: bytes per embedding (must divide the embedding dim), float re-rank depth, and where the
+    # re-rank vectors are memory-mapped (empty: the temp dir); PQ_VECTORS_IN_MEMORY keeps them in RAM
+    PQ_SUBQUANTIZERS: int = 64
+    PQ_RERANK_CANDIDATES: int = 100
+    PQ_VECTORS_PATH: str = ""
+    PQ_VECTORS_IN_MEMORY: bool = False
+
+    # Memory-mapped gallery snapshot (matrix + id sidecar) shared by workers; startup applies only the DB delta
+    GALLERY_SNAPSHOT_ENABLED: bool = True
+    GALLERY_SNAPSHOT_DIR: str = "gallery_snapshot"
+    # Poll the gallery_changes table so every worker sees other workers' registrations/deletions
+    GALLERY_SYNC_ENABLED: bool = True
+    GALLERY_SYNC_INTERVAL_SECONDS: float = 1.0
+
+    # Query embedding cache keyed by a hash of the uploaded bytes (disable for privacy-sensitive deployments)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_SIZE: int = 1024
+    EMBEDDING_CACHE_TTL_SECONDS: float = 300.0
+
+    # Max images per /users/search/batch request
+    SEARCH_BATCH_MAX_IMAGES: int = 64
+    # Max faces matched per image by /users/search/faces
+    MULTI_FACE_MAX_FACES: int = 20
+
+    # WebSocket /stream/recognize: run YuNet every N processed frames and track faces by IoU in between
+    STREAM_DETECT_EVERY_N_FRAMES: int = 3
+    STREAM_IOU_THRESHOLD: float = 0.3
+    # Detection rounds a track may go unmatched before it is dropped
+    STREAM_TRACK_MAX_MISSES: int = 2
+    STREAM_MAX_FRAME_BYTES: int = 2 * 1024 * 1024
+    # Re-embed a tracked face only when new, when its detection score rises by SCORE_GAIN, or every INTERVAL;
+    # SMOOTHING is the weight of the newest embedding in the track's running mean
+    STREAM_REEMBED_INTERVAL_SECONDS: float = 2.0
+    STREAM_REEMBED_SCORE_GAIN: float = 0.05
+    STREAM_IDENTITY_SMOOTHING: float = 0.5
+
+    # Background prediction_logs writer (app/services/prediction_log_writer.py): multi-row INSERTs of up to
+    # BATCH_SIZE rows, at least every FLUSH_INTERVAL_MS. Past half the queue only BUSY_SAMPLE_RATE of the
+    # entries are kept; a full queue drops them. STORE_EMBEDDING=False logs a BLAKE2b digest instead of the vector
+    PREDICTION_LOG_ENABLED: bool = True
+    PREDICTION_LOG_QUEUE_SIZE: int = 10000
+    PREDICTION_LOG_BATCH_SIZE: int = 500
+    PREDICTION_LOG_FLUSH_INTERVAL_MS: float = 1000.0
+    PREDICTION_LOG_BUSY_SAMPLE_RATE: float = 0.1
+    PREDICTION_LOG_STORE_EMBEDDING: bool = True
+
+    # Per-stage timers (app/core/metrics.py): Prometheus text at /metrics, Server-Timing response header
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Bulk registration pipeline
+    BULK_REGISTER_CONCURRENCY: int = 16
+    BULK_REGISTER_COMMIT_SIZE: int = 200
 
     LOG_LEVEL: str = "INFO"
     LOG_FILE_PATH: str = "logs/server.log"
@@ -0,0 +1,161 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; fine-grained at the low end where decode / normalize / search live
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages recorded while serving the current request, in order; None outside a request.
+# compute_pool.run copies the context into its worker thread, so stages timed there land here too.
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_stages", default=None)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with Prometheus text rendering; one series per label tuple."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum]
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labelvalues, counts, total in snapshot:
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "face_stage_duration_seconds", "Time spent in one stage of request handling.", ("stage",)
+)
+request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block into `face_stage_duration_seconds{stage=name}` and the request's Server-Timing."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name: str, seconds: float):
+    stage_seconds.observe(seconds, name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+def server_timing_header(stages: Iterable[Tuple[str, float]], total: float) -> str:
+    """`name;dur=ms` per stage (repeated stages summed, first-seen order) plus the request total."""
+    merged: Dict[str, float] = {}
+    for name, seconds in stages:
+        merged[name] = merged.get(name, 0.0) + seconds
+    merged["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items())
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware: collects the stages timed during each HTTP request, returns them as a
+    `Server-Timing` header and records request latency per route template.
+
+    Stages that finish after the response headers are sent (streamed bodies) only reach the histograms."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    header = server_timing_header(stages, time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            request_seconds.observe(time.perf_counter() - start, scope["method"], _route_template(scope), str(status))
+
+
+def render_prometheus(samples: Iterable[Tuple[str, str, str, float]] = ()) -> str:
+    """Histograms plus point-in-time (name, type, help, value) samples in Prometheus text format 0.0.4."""
+    lines = []
+    for name, metric_type, documentation, value in samples:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+    lines += stage_seconds.render()
+    lines += request_seconds.render()
+    return "\n".join(lines) + "\n"
+
+
+def _route_template(scope) -> str:
+    """The matched route's path template (e.g. `/api/v1/users/face-image/{identity_id}`), so ids do not
+    become label values. Routes included under a prefix only know their own part of the path in
+    newer FastAPI versions; the literal prefix is then taken from the request path in front of it."""
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path_regex"):
+        return "unmatched"
+    path = scope["path"]
+    if route.path_regex.fullmatch(path):
+        return route.path
+    leaf = re.search(route.path_regex.pattern.lstrip("^"), path)
+    return (path[:leaf.start()] if leaf else "") + route.path
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import JSONB 
 from sqlalchemy.sql import func
@@ -7,19 +7,33 @@ from sqlalchemy.sql import func
 from app.db.base import Base
 
 class User(Base):
-    """User record with face embedding (stored as JSON text)."""
+    """User record with face embedding (binary blob, see `recognition.encode_embedding`)."""
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     identity_id: Mapped[str] = mapped_column(String(50), unique=True, index=True)
-    face_embedding: Mapped[str] = mapped_column(Text, nullable=False)
+    face_embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
     face_image_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
     face_preprocessed_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
 
+class GalleryChange(Base):
+    """Append-only gallery change feed. Written in the same transaction as the user change; every
+    worker polls rows past its last applied `id` to keep its in-memory gallery in sync."""
+    __tablename__ = "gallery_changes"
+    # AUTOINCREMENT on SQLite so sequence numbers are never reused
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # "add" | "activate" | "deactivate" | "remove" | "clear" (user_id is NULL)
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
 class PredictionLog(Base):
     """Log entry for raw ONNX inference requests and results."""
     __tablename__ = "prediction_logs"
@@ -1,49 +1,283 @@
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
 import numpy as np
 import onnxruntime as ort
 from app.core.config import settings
+from app.core.metrics import stage
 from loguru import logger
 
 
+_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+# ArcFace-style defaults for input dims the graph leaves symbolic (NCHW float / NHWC uint8 models)
+_DEFAULT_INPUT_DIMS = (3, 112, 112)
+_DEFAULT_UINT8_INPUT_DIMS = (112, 112, 3)
+
+
+def int8_model_path() -> str:
+    """Where the INT8 variant of MODEL_PATH lives: INT8_MODEL_PATH, else `<model>.int8.onnx` beside it."""
+    return settings.INT8_MODEL_PATH or str(Path(settings.MODEL_PATH).with_suffix(".int8.onnx"))
+
+
 class ModelService:
     """Singleton ONNX face-embedding model; load once at startup, reuse per request."""
 
     def __init__(self):
         self.model_path = settings.MODEL_PATH
+        self.precision = "float32"
         self.session = None
+        # None when the model's batch axis is dynamic; otherwise the fixed N the graph was exported with.
+        self.fixed_batch_size = None
+        # True for models with normalization fused in (scripts/fuse_preprocessing.py): uint8 NHWC BGR input
+        self.input_uint8 = False
+        self.input_dtype = np.float32
+        self.optimized_model_path: Optional[str] = None
+        self.optimized_model_cached = False
+        self.warmup_ms: Dict[int, float] = {}
 
     def load_model(self):
-        """Loads the ONNX model; prefers CoreML on macOS, falls back to CPU."""
-        logger.info(f"Model Path: {settings.MODEL_PATH}")
+        """Loads the ONNX model; prefers CoreML on macOS, falls back to CPU.
+
+        Session options (optimization level, thread counts, execution mode) come from ORT_* settings.
+        With ORT_OPTIMIZED_MODEL_DIR set, the optimized graph is saved there on first load and loaded
+        with optimizations disabled on later starts. Then the model is warmed up (see `warm_up`).
+        """
+        self.precision, self.model_path = self._select_model()
+        logger.info(f"Model Path: {self.model_path} ({self.precision})")
 
         providers = ['CoreMLExecutionProvider', 'CPUExecutionProvider']
 
         try:
-            self.session = ort.InferenceSession(self.model_path, providers=providers)
+            self.session = self._create_session(providers)
             logger.info(f"ONNX providers: {self.session.get_providers()}")
 
-            self.input_name = self.session.get_inputs()[0].name
-            
+            model_input = self.session.get_inputs()[0]
+            self.input_name = model_input.name
+            self.input_shape = list(model_input.shape)
+            self.input_uint8 = model_input.type == "tensor(uint8)"
+            self.input_dtype = np.uint8 if self.input_uint8 else np.float32
+            if self.input_uint8:
+                logger.info("Model takes uint8 NHWC BGR input; normalization runs inside the graph")
+            batch_dim = model_input.shape[0] if model_input.shape else None
+            self.fixed_batch_size = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+            if self.fixed_batch_size is None:
+                logger.info(f"Model input {model_input.shape}: dynamic batch axis")
+            else:
+                logger.warning(
+                    f"Model input {model_input.shape}: fixed batch size {self.fixed_batch_size}; "
+                    "batches will be chunked (see scripts/make_batch_dynamic.py)"
+                )
+
         except Exception as e:
             logger.error(f"Model load failed: {e}")
             self.session = None
             raise e
-    
+
+        self.warm_up(settings.ORT_WARMUP_BATCH_SIZES)
+
+    @staticmethod
+    def _select_model():
+        """(precision, path) per MODEL_PRECISION; a missing INT8 file falls back to the float model."""
+        precision = settings.MODEL_PRECISION.lower()
+        if precision == "int8":
+            path = int8_model_path()
+            if Path(path).is_file():
+                return "int8", path
+            logger.error(f"MODEL_PRECISION=int8 but {path} does not exist (see scripts/quantize_int8.py); "
+                         "serving the float32 model")
+        elif precision != "float32":
+            logger.warning(f"Unknown MODEL_PRECISION {settings.MODEL_PRECISION!r}; serving the float32 model")
+        return "float32", settings.MODEL_PATH
+
+    def _session_options(self) -> ort.SessionOptions:
+        level = settings.ORT_GRAPH_OPTIMIZATION_LEVEL.lower()
+        if level not in _OPTIMIZATION_LEVELS:
+            raise ValueError(f"ORT_GRAPH_OPTIMIZATION_LEVEL must be one of {list(_OPTIMIZATION_LEVELS)}, got {level!r}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = _OPTIMIZATION_LEVELS[level]
+        options.intra_op_num_threads = max(0, settings.ORT_INTRA_OP_THREADS)
+        options.inter_op_num_threads = max(0, settings.ORT_INTER_OP_THREADS)
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if settings.ORT_EXECUTION_MODE.lower() == "parallel"
+            else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        return options
+
+    def _create_session(self, providers: List[str]) -> ort.InferenceSession:
+        options = self._session_options()
+        self.optimized_model_path = None
+        self.optimized_model_cached = False
+        if not settings.ORT_OPTIMIZED_MODEL_DIR:
+            return ort.InferenceSession(self.model_path, sess_options=options, providers=providers)
+
+        # "all" adds layout transforms (NCHWc) specific to this CPU, so the cache stops at "extended"
+        # and the rest runs when the cached graph is loaded. Extended fusions depend on the ORT build
+        # and providers, so those are in the key too; stale once the source is newer.
+        level = settings.ORT_GRAPH_OPTIMIZATION_LEVEL.lower()
+        saved_level = "extended" if level == "all" else level
+        host = "-".join([f"ort{ort.__version__}", platform.machine().lower() or "unknown"] + [
+            p.replace("ExecutionProvider", "").lower() for p in providers if p in ort.get_available_providers()
+        ])
+        source = Path(self.model_path)
+        cached = Path(settings.ORT_OPTIMIZED_MODEL_DIR) / f"{source.stem}.{saved_level}.{host}.optimized.onnx"
+        fresh = cached.is_file() and cached.stat().st_mtime >= source.stat().st_mtime
+        if not fresh and not self._save_optimized(cached, saved_level, providers):
+            return ort.InferenceSession(self.model_path, sess_options=options, providers=providers)
+
+        options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL if level == "all" else ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        )
+        try:
+            session = ort.InferenceSession(str(cached), sess_options=options, providers=providers)
+        except Exception as e:
+            logger.warning(f"Could not load pre-optimized model {cached} ({e}); loading {source} instead")
+            return ort.InferenceSession(self.model_path, sess_options=self._session_options(), providers=providers)
+        self.optimized_model_path, self.optimized_model_cached = str(cached), fresh
+        logger.info(f"Loaded pre-optimized model {cached}")
+        return session
+
+    def _save_optimized(self, cached: Path, level: str, providers: List[str]) -> bool:
+        """Writes the model optimized at `level` to `cached` via a per-process temp file and rename,
+        so concurrent workers never load a partial file. False when the graph cannot be saved."""
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_name(f"{cached.name}.tmp{os.getpid()}")
+        options = self._session_options()
+        options.graph_optimization_level = _OPTIMIZATION_LEVELS[level]
+        options.optimized_model_filepath = str(tmp)
+        try:
+            ort.InferenceSession(self.model_path, sess_options=options, providers=providers)
+            os.replace(tmp, cached)
+        except Exception as e:
+            # e.g. an execution provider compiled nodes that cannot be serialized
+            logger.warning(f"Could not save optimized model to {cached} ({e}); loading without the cache")
+            tmp.unlink(missing_ok=True)
+            return False
+        logger.info(f"Saved optimized model to {cached}")
+        return True
+
+    def warm_up(self, batch_sizes: List[int]):
+        """Runs one zero batch per size so lazy allocations / kernel selection happen before the first request."""
+        self.warmup_ms = {}
+        if self.session is None:
+            return
+        sizes = [self.fixed_batch_size] if self.fixed_batch_size else sorted({b for b in batch_sizes if b > 0})
+        dims = [
+            d if isinstance(d, int) and d > 0 else default
+            for d, default in zip(self.input_shape[1:], _DEFAULT_UINT8_INPUT_DIMS if self.input_uint8 else _DEFAULT_INPUT_DIMS)
+        ]
+        for size in sizes:
+            start = time.perf_counter()
+            try:
+                self._run(np.zeros([size] + dims, dtype=self.input_dtype))
+            except Exception:
+                logger.warning(f"Warm-up at batch size {size} failed; skipping the rest")
+                break
+            self.warmup_ms[size] = round((time.perf_counter() - start) * 1000, 3)
+        if self.warmup_ms:
+            logger.info(f"Model warm-up (batch size -> ms): {self.warmup_ms}")
+
+    def stats(self) -> dict:
+        """Effective session configuration and warm-up timings, for /health."""
+        if self.session is None:
+            return {"loaded": False}
+        options = self.session.get_session_options()
+        return {
+            "loaded": True,
+            "precision": self.precision,
+            "model_path": self.model_path,
+            "providers": self.session.get_providers(),
+            "input_shape": self.input_shape,
+            "input_format": "nhwc_uint8" if self.input_uint8 else "nchw_float32",
+            "graph_optimization_level": settings.ORT_GRAPH_OPTIMIZATION_LEVEL.lower(),
+            # 0 means ORT's default (one intra-op thread per physical core)
+            "intra_op_threads": options.intra_op_num_threads,
+            "inter_op_threads": options.inter_op_num_threads,
+            "execution_mode": "parallel" if options.execution_mode == ort.ExecutionMode.ORT_PARALLEL else "sequential",
+            "cpu_count": os.cpu_count(),
+            "optimized_model_path": self.optimized_model_path,
+            "optimized_model_cached": self.optimized_model_cached,
+            "warmup_ms": self.warmup_ms,
+            "warmup_total_ms": round(sum(self.warmup_ms.values()), 3),
+        }
+
+    def check_input(self, input_tensor: np.ndarray):
+        """Raises ValueError when a client tensor does not match the model's input dtype, layout or shape.
+
+        Float models take NCHW float32 (float16 is widened); fused models take NHWC uint8 crops.
+        Nothing is cast across kinds: float pixels would be truncated by a uint8 model and raw
+        uint8 pixels would reach a float model unnormalized."""
+        if self.input_uint8:
+            if input_tensor.dtype != np.uint8:
+                raise ValueError(f"Model takes uint8 NHWC input, got {input_tensor.dtype}")
+            channel_axis, layout = -1, "NHWC"
+        else:
+            if input_tensor.dtype.kind != "f":
+                raise ValueError(f"Model takes float32 NCHW input, got {input_tensor.dtype}")
+            channel_axis, layout = 1, "NCHW"
+        if input_tensor.ndim != 4 or input_tensor.shape[channel_axis] != 3:
+            raise ValueError(f"Expected a {layout} tensor with 3 channels, got shape {list(input_tensor.shape)}")
+        # Fixed (non-batch) dims of the graph must match exactly, or ORT fails the run with a 500
+        for axis, dim in enumerate(self.input_shape[1:], start=1):
+            if isinstance(dim, int) and dim > 0 and input_tensor.shape[axis] != dim:
+                raise ValueError(
+                    f"Input shape {list(input_tensor.shape)} does not match model input {self.input_shape} (axis {axis})"
+                )
 
     def inference(self, input_img):
-        """Runs ONNX inference; returns embedding list. Expects NCHW float32 input."""
+        """Runs ONNX inference; returns embedding list. Expects NCHW float32 input (NHWC uint8 for fused models)."""
+        return self._run(input_img).tolist()
+
+    def embed(self, input_tensor: np.ndarray) -> np.ndarray:
+        """Runs ONNX inference on a single preprocessed face; returns its embedding as a flat float32 array."""
+        return self._run(input_tensor)[0]
+
+    def inference_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Runs ONNX inference on a stacked (N, 3, H, W) batch ((N, H, W, 3) uint8 for fused models); returns (N, D) float32 embeddings.
+
+        Dynamic-batch models get one `session.run`; fixed-batch models are run in chunks of their
+        batch size, zero-padding the last chunk and trimming its extra rows."""
+        size = self.fixed_batch_size
+        if size is None or len(batch) == size:
+            return self._run(batch)
+
+        outputs = []
+        for start in range(0, len(batch), size):
+            chunk = batch[start:start + size]
+            valid = len(chunk)
+            if valid < size:
+                padding = np.zeros((size - valid,) + chunk.shape[1:], dtype=chunk.dtype)
+                chunk = np.concatenate([chunk, padding], axis=0)
+            outputs.append(self._run(chunk)[:valid])
+        return np.concatenate(outputs, axis=0)
+
+    def _run(self, input_img) -> np.ndarray:
         if self.session is None:
             logger.error("Model not loaded")
             raise RuntimeError("Model is not loaded")
         
         try:
             if isinstance(input_img, list):
-                input_tensor = np.array(input_img, dtype=np.float32)
+                input_tensor = np.array(input_img, dtype=self.input_dtype)
             else:
-                input_tensor = input_img.astype(np.float32)
+                input_tensor = np.ascontiguousarray(input_img)
+                if input_tensor.dtype != self.input_dtype:
+                    # Widening float16 is lossless; anything else is a caller bug (see check_input)
+                    if input_tensor.dtype.kind != "f" or self.input_uint8:
+                        raise ValueError(f"Input dtype {input_tensor.dtype} does not match model input {np.dtype(self.input_dtype)}")
+                    input_tensor = input_tensor.astype(self.input_dtype)
             
-            result = self.session.run(None, {self.input_name: input_tensor})
+            with stage("model_run"):
+                result = self.session.run(None, {self.input_name: input_tensor})
 
-            return result[0].tolist()
+            return result[0]
         except Exception as e:
             logger.exception("Inference error")
             raise e    
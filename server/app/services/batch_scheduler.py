@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import stage
+from app.services.ai_service import ModelService, ai_service
+from app.services.compute_pool import compute_pool
+
+# Queued by stop() behind the last request; the dispatch loop runs everything before it and exits
+_STOP = object()
+
+
+class InferenceBatcher:
+    """Async micro-batcher in front of `ModelService`.
+
+    Concurrent single-face embedding requests are queued, collected for up to `window_ms`
+    (or until `max_batch_size` are pending), stacked into one input batch and run with a
+    single `session.run` on the compute pool; each caller gets its own row back.
+    """
+
+    def __init__(self, model: ModelService, max_batch_size: int, window_ms: float, enabled: bool = True):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Counter = Counter()
+        self.queue_wait_ms_total = 0.0
+        self.queue_wait_ms_max = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done() and not self._stopping
+
+    async def start(self):
+        """Starts the dispatch loop on the running event loop; call from lifespan."""
+        if not self.enabled or self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._worker = asyncio.create_task(self._dispatch_loop())
+        logger.info(
+            f"Inference batching started (max batch {self.max_batch_size}, window {self.window * 1000:.1f}ms)"
+        )
+
+    async def stop(self):
+        """Stops accepting requests, lets the dispatch loop run what is already queued, then fails
+        anything left (only possible if the loop died). The loop is not cancelled: that would leave
+        the in-flight batch's futures, and everything queued behind it, unresolved."""
+        if self._worker is None:
+            return
+        self._stopping = True
+        if not self._worker.done():
+            self._queue.put_nowait(_STOP)
+            await self._worker
+        self._worker = None
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is not _STOP and not entry[1].done():
+                entry[1].set_exception(RuntimeError("Inference batcher stopped"))
+
+    async def embed(self, input_tensor: np.ndarray) -> np.ndarray:
+        """Embeds one preprocessed face (a batch of one, as `pre_process` returns it); returns its flat float32 embedding.
+        Timed as the "inference" stage, queue wait included."""
+        with stage("inference"):
+            if not self.is_running:
+                return await compute_pool.run(self.model.embed, input_tensor, block=True)
+
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((input_tensor, future, time.perf_counter()))
+            return await future
+
+    async def _dispatch_loop(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            if not self._stopping and self._queue.qsize() < self.max_batch_size - 1 and self.window > 0:
+                await asyncio.sleep(self.window)
+
+            batch, stopped = [first], False
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is _STOP:
+                    stopped = True
+                    break
+                batch.append(entry)
+
+            await self._run_batch(batch)
+            if stopped:
+                return
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]):
+        dispatched_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            wait_ms = (dispatched_at - enqueued_at) * 1000
+            self.queue_wait_ms_total += wait_ms
+            self.queue_wait_ms_max = max(self.queue_wait_ms_max, wait_ms)
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes[len(batch)] += 1
+
+        try:
+            stacked = np.concatenate([tensor for tensor, _, _ in batch], axis=0)
+            embeddings = await compute_pool.run(self.model.inference_batch, stacked, block=True)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for row, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(embeddings[row])
+
+    def stats(self) -> dict:
+        """Achieved batch sizes and queue wait, for /health."""
+        return {
+            "enabled": self.is_running,
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+            "avg_queue_wait_ms": round(self.queue_wait_ms_total / self.items, 3) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.queue_wait_ms_max, 3),
+        }
+
+
+inference_batcher = InferenceBatcher(
+    ai_service,
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    window_ms=settings.INFERENCE_BATCH_WINDOW_MS,
+    enabled=settings.INFERENCE_BATCHING_ENABLED,
+)
@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class ComputePoolBusy(Exception):
+    """Raised when the compute pool queue is full; mapped to 503 + Retry-After in main.py."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Compute pool is saturated")
+        self.retry_after = retry_after
+
+
+class ComputePool:
+    """Bounded thread pool for CPU-bound image work (decode, YuNet, ONNX) kept off the event loop.
+
+    Threads suffice because cv2 and onnxruntime release the GIL. At most `max_workers` jobs
+    run and `max_queue` more wait; beyond that `run` raises `ComputePoolBusy` instead of
+    letting latency grow without bound.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int = 1):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compute")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, block: bool = False, **kwargs: Any) -> Any:
+        """Runs fn(*args, **kwargs) on a worker thread, in a copy of the caller's context (so stage
+        timers inside fn count towards the calling request's Server-Timing).
+
+        Args:
+            block: Wait for a free slot instead of failing fast. Use for work that was already
+                admitted (e.g. inside a bulk job or the batcher), not for new requests.
+        """
+        if not block:
+            self.check_capacity()
+
+        async with self._get_slots():
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                context = contextvars.copy_context()
+                return await loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args, **kwargs))
+            finally:
+                self.pending -= 1
+                self.completed += 1
+
+    def check_capacity(self):
+        """Fails fast with `ComputePoolBusy` if no slot is free; lets multi-job requests admit themselves once."""
+        if self._get_slots().locked():
+            self.rejected += 1
+            raise ComputePoolBusy(self.retry_after)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return self._slots
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Compute pool shut down")
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+compute_pool = ComputePool(
+    max_workers=settings.COMPUTE_POOL_WORKERS,
+    max_queue=settings.COMPUTE_POOL_QUEUE_SIZE,
+    retry_after=settings.COMPUTE_POOL_RETRY_AFTER_SECONDS,
+)
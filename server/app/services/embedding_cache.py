@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class EmbeddingCache:
+    """LRU + TTL cache of query embeddings keyed by a BLAKE2b digest of the uploaded image bytes.
+
+    Only the embedding is stored, never a match result, so gallery changes are always reflected.
+    Byte-identical re-uploads skip decode, YuNet and ONNX. Values are read-only arrays.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self.enabled = enabled and self.max_entries > 0
+        self._entries: "OrderedDict[bytes, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(contents: bytes) -> bytes:
+        return hashlib.blake2b(contents, digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, embedding = entry
+            if self.ttl > 0 and now - stored_at > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key: bytes, embedding: np.ndarray):
+        if not self.enabled:
+            return
+        value = np.array(embedding, dtype=np.float32).reshape(-1)
+        value.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    enabled=settings.EMBEDDING_CACHE_ENABLED,
+)
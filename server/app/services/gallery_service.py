@@ -0,0 +1,382 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import stage
+from app.db.models import GalleryChange, User
+from app.db.session import AsyncSessionLocal
+from app.services.compute_pool import compute_pool
+from app.utils.gallery_snapshot import GallerySnapshot, read_snapshot, write_snapshot
+from app.utils.recognition import (
+    EmbeddingIndex, EmbeddingLike, SearchBackend, create_search_backend, load_search_backend,
+)
+
+# Max ids per IN (...) when re-reading changed users
+USER_LOOKUP_CHUNK = 500
+# How long an unseen change sequence number (an uncommitted or rolled-back transaction) is re-polled
+CHANGE_GAP_TIMEOUT_SECONDS = 30.0
+
+
+def record_gallery_changes(db: AsyncSession, op: str, user_ids: Iterable[Optional[int]]):
+    """Appends change-log rows to the caller's transaction; commit them together with the user change."""
+    db.add_all([GalleryChange(user_id=user_id, op=op) for user_id in user_ids])
+
+
+def _pq_storage_options() -> Dict[str, Any]:
+    """Where PQIndex keeps its float re-rank rows (memory-mapped file by default, see PQ_VECTORS_*)."""
+    return {"vectors_path": settings.PQ_VECTORS_PATH or None, "in_memory": settings.PQ_VECTORS_IN_MEMORY}
+
+
+class GalleryService:
+    """Singleton in-memory gallery of active users' embeddings; built at startup, updated directly by this
+    worker's user endpoints and, for changes made by other workers, by polling the `GalleryChange` log."""
+
+    def __init__(self):
+        self.index: SearchBackend = self._new_index()
+        self._lock = threading.RLock()
+        self.is_loaded = False
+        # Highest GalleryChange.id applied to the index; snapshots record it as their last DB change
+        self.last_change = 0
+        self._dirty = False
+        self._change_gaps: Dict[int, float] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        self.changes_applied = 0
+        self.last_sync_at: Optional[float] = None
+        # Background rebuild of an IVF / PQ index that grew past its training size; changes made
+        # while it runs are journaled and replayed onto the trained copy before it is swapped in
+        self._training: Optional[asyncio.Task] = None
+        self._journal: Optional[List[Tuple[str, Optional[int], Optional[EmbeddingLike]]]] = None
+        self.trainings = 0
+
+    @staticmethod
+    def _new_index() -> SearchBackend:
+        if settings.SEARCH_BACKEND == "ivf":
+            return create_search_backend("ivf", nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+        if settings.SEARCH_BACKEND == "pq":
+            return create_search_backend(
+                "pq", m=settings.PQ_SUBQUANTIZERS, rerank=settings.PQ_RERANK_CANDIDATES, **_pq_storage_options()
+            )
+        return create_search_backend(settings.SEARCH_BACKEND)
+
+    def _restore_index(self) -> SearchBackend:
+        """Reuses a saved index (e.g. trained IVF centroids / PQ codebooks) from SEARCH_INDEX_PATH when it matches the backend."""
+        path = settings.SEARCH_INDEX_PATH
+        if not path or not os.path.exists(path):
+            return self._new_index()
+        try:
+            index = load_search_backend(path, **_pq_storage_options())
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable search index {path}: {e}")
+            return self._new_index()
+        if index.name != settings.SEARCH_BACKEND:
+            logger.info(f"Ignoring saved {index.name} index {path}; SEARCH_BACKEND is {settings.SEARCH_BACKEND}")
+            return self._new_index()
+        if settings.SEARCH_BACKEND == "ivf":
+            index.nprobe = settings.IVF_NPROBE
+        elif settings.SEARCH_BACKEND == "pq":
+            index.rerank = settings.PQ_RERANK_CANDIDATES
+        return index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    async def load(self, db: AsyncSession):
+        """Builds the index: from the mapped gallery snapshot plus the change log since it when one
+        exists, otherwise from all active users in one query (id + embedding columns only)."""
+        latest_change = await self._latest_change(db)
+        snapshot = read_snapshot() if settings.GALLERY_SNAPSHOT_ENABLED else None
+        index = self._restore_index()
+        if snapshot is not None:
+            try:
+                if await self._load_from_snapshot(db, index, snapshot, latest_change):
+                    return
+            except ValueError as e:
+                logger.warning(f"Gallery snapshot unusable ({e}); rebuilding from the database")
+            index = self._new_index()
+
+        result = await db.execute(
+            select(User.id, User.face_embedding).where(User.is_active == True)
+        )
+        rows = result.all()
+        index.build([row.id for row in rows], [row.face_embedding for row in rows])
+        # Changes committed while this ran are re-applied by the poller; applying is idempotent
+        self._install(index, latest_change)
+        logger.info(f"Gallery index built ({index.name}): {len(rows)} active users, change seq {latest_change}")
+        self._dirty = True
+        self.save()
+
+    async def _load_from_snapshot(self, db: AsyncSession, index: SearchBackend, snapshot: GallerySnapshot,
+                                  latest_change: int) -> bool:
+        """Maps the snapshot rows and re-syncs only users named in the change log since it.
+        Returns False (caller does a full load) if a clear happened since or the log was reset."""
+        if latest_change < snapshot.last_change:
+            logger.info("Change log is behind the gallery snapshot (database reset?); ignoring snapshot")
+            return False
+        result = await db.execute(
+            select(GalleryChange.user_id, GalleryChange.op).where(GalleryChange.id > snapshot.last_change)
+        )
+        changes = result.all()
+        if any(change.op == "clear" for change in changes):
+            return False
+
+        if isinstance(index, EmbeddingIndex):
+            # Exact backend searches the shared copy-on-write mapping directly
+            index.attach(snapshot.ids, snapshot.matrix, snapshot.rows)
+        else:
+            index.build(snapshot.ids, np.asarray(snapshot.matrix[:snapshot.rows]))
+        added, removed = await self._reconcile(db, index, {change.user_id for change in changes})
+
+        self._install(index, max(snapshot.last_change, latest_change))
+        logger.info(
+            f"Gallery index loaded from snapshot generation {snapshot.generation} ({index.name}): "
+            f"{snapshot.rows} rows, {len(changes)} changes since (+{added} -{removed}) -> {len(index)} active users"
+        )
+        self._dirty = bool(added or removed)
+        self.save()
+        return True
+
+    @staticmethod
+    async def _latest_change(db: AsyncSession) -> int:
+        result = await db.execute(select(func.max(GalleryChange.id)))
+        return result.scalar() or 0
+
+    async def _reconcile(self, db: AsyncSession, index: SearchBackend, user_ids: Iterable[Optional[int]]) -> Tuple[int, int]:
+        """Makes the index agree with the users' current DB rows: active -> (re)added, inactive or deleted -> removed.
+
+        Reading current state rather than replaying ops makes applying a change idempotent and
+        independent of the order in which transactions committed.
+        """
+        user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+        added = removed = 0
+        for i in range(0, len(user_ids), USER_LOOKUP_CHUNK):
+            chunk = user_ids[i:i + USER_LOOKUP_CHUNK]
+            result = await db.execute(
+                select(User.id, User.face_embedding).where(User.id.in_(chunk), User.is_active == True)
+            )
+            active = {row.id: row.face_embedding for row in result.all()}
+            with self._lock:
+                for user_id in chunk:
+                    if user_id in active:
+                        self._apply(index, "add", user_id, active[user_id])
+                        added += 1
+                    elif self._apply(index, "remove", user_id):
+                        removed += 1
+        if added or removed:
+            self._dirty = True
+            self._schedule_training()
+        return added, removed
+
+    async def sync(self, db: AsyncSession) -> int:
+        """Applies change-log rows past `last_change` (plus recently skipped sequence numbers whose
+        transactions may commit late); returns how many changes were applied."""
+        gaps = list(self._change_gaps)
+        condition = GalleryChange.id > self.last_change
+        if gaps:
+            condition = or_(condition, GalleryChange.id.in_(gaps))
+        result = await db.execute(
+            select(GalleryChange.id, GalleryChange.user_id, GalleryChange.op)
+            .where(condition)
+            .order_by(GalleryChange.id)
+        )
+        changes = result.all()
+        now = time.monotonic()
+        self.last_sync_at = time.time()
+        self._change_gaps = {seq: deadline for seq, deadline in self._change_gaps.items() if deadline > now}
+        if not changes:
+            return 0
+
+        seen = {change.id for change in changes}
+        for seq in seen:
+            self._change_gaps.pop(seq, None)
+        newest = max(seen)
+        for seq in range(self.last_change + 1, newest):
+            if seq not in seen and len(self._change_gaps) < 10_000:
+                self._change_gaps[seq] = now + CHANGE_GAP_TIMEOUT_SECONDS
+
+        clears = [change.id for change in changes if change.op == "clear"]
+        if clears:
+            # Everything before the newest clear is moot; users re-registered since have later changes
+            with self._lock:
+                self._apply(self.index, "clear")
+            self._dirty = True
+            changes = [change for change in changes if change.id > max(clears)]
+        await self._reconcile(db, self.index, (change.user_id for change in changes))
+
+        self.last_change = max(self.last_change, newest)
+        self.changes_applied += len(seen)
+        return len(seen)
+
+    async def start_sync(self):
+        """Starts polling the change log every GALLERY_SYNC_INTERVAL_SECONDS; call from lifespan after `load`."""
+        if not settings.GALLERY_SYNC_ENABLED or self._sync_task is not None:
+            return
+        self._sync_task = asyncio.create_task(self._sync_loop())
+        logger.info(f"Gallery change-log sync started (every {settings.GALLERY_SYNC_INTERVAL_SECONDS}s)")
+
+    async def stop_sync(self):
+        if self._training is not None:
+            self._training.cancel()
+        if self._sync_task is None:
+            return
+        self._sync_task.cancel()
+        try:
+            await self._sync_task
+        except asyncio.CancelledError:
+            pass
+        self._sync_task = None
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(settings.GALLERY_SYNC_INTERVAL_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.sync(db)
+            except Exception as e:
+                logger.error(f"Gallery change-log sync failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.index.name,
+            "size": len(self.index),
+            "last_change": self.last_change,
+            "changes_applied": self.changes_applied,
+            "pending_gaps": len(self._change_gaps),
+            "sync_enabled": self._sync_task is not None,
+            "last_sync_age_seconds": round(time.time() - self.last_sync_at, 3) if self.last_sync_at else None,
+            "training": self._training is not None,
+            "trainings": self.trainings,
+        }
+
+    def _install(self, index: SearchBackend, last_change: int):
+        with self._lock:
+            self.index = index
+            self.last_change = last_change
+        self.is_loaded = True
+        self._schedule_training()
+
+    def _apply(self, index: SearchBackend, op: str, user_id: Optional[int] = None,
+               embedding: Optional[EmbeddingLike] = None) -> bool:
+        """Applies one change to `index` (caller holds the lock); journals it while the live index is being retrained."""
+        if index is self.index and self._journal is not None:
+            self._journal.append((op, user_id, embedding))
+        if op == "add":
+            index.add(user_id, embedding)
+            return True
+        if op == "remove":
+            return index.remove(user_id)
+        index.clear()
+        return True
+
+    def _schedule_training(self):
+        """Starts a background rebuild once the live index needs training; k-means runs on the compute pool."""
+        if self._training is not None or not self.index.needs_training:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._training = loop.create_task(self._train_in_background())
+
+    @staticmethod
+    def _trained_copy(index_cls, state: Dict[str, np.ndarray]) -> SearchBackend:
+        options = _pq_storage_options() if index_cls.name == "pq" else {}
+        index = index_cls.from_state(state, **options)
+        if index.needs_training:
+            index.train()
+        return index
+
+    async def _train_in_background(self):
+        try:
+            with self._lock:
+                index = self.index
+                # Copied under the lock: the rebuild must not see rows changing underneath it
+                state = {key: np.array(value) for key, value in index.state().items()}
+                self._journal = []
+            trained = await compute_pool.run(self._trained_copy, type(index), state, block=True)
+            with self._lock:
+                if self.index is not index:
+                    return  # replaced by a reload meanwhile
+                for op, user_id, embedding in self._journal:
+                    self._apply(trained, op, user_id, embedding)
+                self.index = trained
+                self._dirty = True
+            self.trainings += 1
+            logger.info(f"Gallery {trained.name} index trained in the background ({len(trained)} rows)")
+        except Exception as e:
+            logger.error(f"Background gallery index training failed: {e}")
+        finally:
+            self._journal = None
+            self._training = None
+
+    def save(self):
+        """Writes the gallery snapshot if the index changed since the last one, and the search index
+        to SEARCH_INDEX_PATH if configured."""
+        if not self.is_loaded:
+            return
+        if settings.GALLERY_SNAPSHOT_ENABLED and self._dirty:
+            self._write_snapshot()
+
+        path = settings.SEARCH_INDEX_PATH
+        if not path:
+            return
+        try:
+            with self._lock:
+                self.index.save(path)
+        except Exception as e:
+            logger.error(f"Failed to save search index to {path}: {e}")
+
+    def _write_snapshot(self):
+        try:
+            with self._lock:
+                state = self.index.state()
+                # An index that never held a row has no dimension yet; the next load's delta covers it
+                if state["vectors"].ndim != 2 or state["vectors"].shape[1] == 0:
+                    return
+                generation = write_snapshot(state["ids"], state["vectors"], self.last_change)
+                self._dirty = False
+            logger.info(f"Gallery snapshot generation {generation} written ({len(state['ids'])} rows)")
+        except Exception as e:
+            logger.error(f"Failed to write gallery snapshot: {e}")
+
+    def add(self, user_id: int, embedding: EmbeddingLike):
+        """Adds or replaces a user's embedding; schedules a background training once an IVF / PQ index is big enough."""
+        with self._lock:
+            self._apply(self.index, "add", user_id, embedding)
+            self._dirty = True
+        self._schedule_training()
+
+    def remove(self, user_id: int):
+        """Drops a user from the gallery; no-op if absent."""
+        with self._lock:
+            self._dirty |= self._apply(self.index, "remove", user_id)
+
+    def clear(self):
+        with self._lock:
+            self._apply(self.index, "clear")
+            self._dirty = True
+
+    def search(self, embedding: EmbeddingLike, k: int = 1) -> List[Tuple[int, float]]:
+        """Returns up to k (user_id, cosine similarity) pairs, best first."""
+        with stage("gallery_search"), self._lock:
+            ids, scores = self.index.search(embedding, k)
+        return [(int(i), float(s)) for i, s in zip(ids, scores)]
+
+    def search_batch(self, embeddings: np.ndarray, k: int = 1) -> List[List[Tuple[int, float]]]:
+        """Matches (M, D) embeddings against the gallery in one matrix product; one ranked list per query."""
+        with stage("gallery_search"), self._lock:
+            ids, scores = self.index.search_batch(embeddings, k)
+        return [
+            [(int(i), float(s)) for i, s in zip(row_ids, row_scores) if i >= 0]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
+
+
+gallery_service = GalleryService()
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import random
+from datetime import datetime
+from typing import List, Optional, Union
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.models import PredictionLog
+from app.db.session import AsyncSessionLocal
+
+# Queued by stop() after the last entry; the flush loop writes what precedes it and exits
+_STOP = object()
+
+
+class PredictionLogWriter:
+    """Background sink for `prediction_logs` rows, so /face/inference never waits on the DB.
+
+    `submit` only enqueues (request path cost: one `put_nowait`). A flush task writes up to
+    `batch_size` rows per multi-row INSERT, as soon as that many are queued or `flush_interval_ms`
+    after the first one. When the DB falls behind, entries are sampled (`busy_sample_rate` of them
+    kept) once the queue is half full and dropped once it is full; both are counted in `stats()`.
+    JSON encoding of the embedding happens on the flush side, off the event loop.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval_ms: float, busy_sample_rate: float,
+                 store_embedding: bool = True, enabled: bool = True):
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.busy_sample_rate = min(1.0, max(0.0, busy_sample_rate))
+        self.store_embedding = store_embedding
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.submitted = 0
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done() and not self._stopping
+
+    async def start(self):
+        """Starts the flush loop on the running event loop; call from lifespan."""
+        if not self.enabled or self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._worker = asyncio.create_task(self._flush_loop())
+        logger.info(
+            f"Prediction log writer started (batch {self.batch_size}, interval {self.flush_interval * 1000:.0f}ms, "
+            f"queue {self.max_queue}, embeddings {'stored' if self.store_embedding else 'digest only'})"
+        )
+
+    async def stop(self):
+        """Stops accepting entries and waits for the flush loop to write whatever is still queued.
+
+        The loop is not cancelled (that could lose an entry it has dequeued or a batch mid-INSERT);
+        it skips the flush interval and exits when it reaches the stop marker."""
+        if self._worker is None:
+            return
+        self._stopping = True
+        self._batch_ready.set()
+        if not self._worker.done():
+            await self._queue.put(_STOP)
+            await self._worker
+        self._worker = None
+
+    def submit(self, request_id: str, embedding: Union[np.ndarray, list], execution_time: float,
+               input_source: str = "api_request") -> bool:
+        """Queues one log entry without blocking; returns False if it was sampled out or dropped."""
+        if not self.is_running:
+            return False
+        self.submitted += 1
+        depth = self._queue.qsize()
+        if depth * 2 >= self.max_queue and random.random() >= self.busy_sample_rate:
+            self.sampled_out += 1
+            return False
+        try:
+            self._queue.put_nowait((request_id, input_source, embedding, execution_time, datetime.now()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        if depth + 1 >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def _flush_loop(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            if not self._stopping and self._queue.qsize() < self.batch_size - 1 and self.flush_interval > 0:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            batch, stopped = [first], False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is _STOP:
+                    stopped = True
+                    break
+                batch.append(entry)
+            await self._write(batch)
+            if stopped:
+                return
+
+    async def _write(self, batch: List[tuple]):
+        try:
+            rows = await asyncio.to_thread(self._to_rows, batch)
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(PredictionLog), rows)
+                await db.commit()
+            self.written += len(rows)
+            self.flushes += 1
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Prediction log flush failed ({len(batch)} rows lost): {e}")
+
+    def _to_rows(self, batch: List[tuple]) -> List[dict]:
+        return [
+            {
+                "request_id": request_id,
+                "input_source": input_source,
+                "result_json": self._encode_result(embedding),
+                "execution_time": execution_time,
+                "created_at": created_at,
+            }
+            for request_id, input_source, embedding, execution_time, created_at in batch
+        ]
+
+    def _encode_result(self, embedding: Union[np.ndarray, list]) -> str:
+        if self.store_embedding:
+            return json.dumps(embedding.tolist() if isinstance(embedding, np.ndarray) else embedding)
+        # BLAKE2b of the float32 bytes: enough to tell whether two requests produced the same output
+        data = np.ascontiguousarray(embedding, dtype=np.float32)
+        return json.dumps({
+            "embedding_digest": hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest(),
+            "shape": list(data.shape),
+        })
+
+    def stats(self) -> dict:
+        """Queue depth and write / degradation counters, for /health."""
+        return {
+            "enabled": self.is_running,
+            "store_embedding": self.store_embedding,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "submitted": self.submitted,
+            "written": self.written,
+            "flushes": self.flushes,
+            "avg_rows_per_flush": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+prediction_log_writer = PredictionLogWriter(
+    max_queue=settings.PREDICTION_LOG_QUEUE_SIZE,
+    batch_size=settings.PREDICTION_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.PREDICTION_LOG_FLUSH_INTERVAL_MS,
+    busy_sample_rate=settings.PREDICTION_LOG_BUSY_SAMPLE_RATE,
+    store_embedding=settings.PREDICTION_LOG_STORE_EMBEDDING,
+    enabled=settings.PREDICTION_LOG_ENABLED,
+)
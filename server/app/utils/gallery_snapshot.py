@@ -0,0 +1,150 @@
+import os
+import struct
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks; the write token below still rejects mixed pairs
+    fcntl = None
+
+# gallery.f32: 64-byte header, then a (capacity, dim) little-endian float32 matrix whose first
+# `rows` rows are L2-normalized embeddings. gallery.ids: 64-byte header, then `rows` int64 user ids.
+# Both headers carry the same generation and a random per-write token, so a reader never pairs a
+# matrix with ids from another write (two workers can write the same generation). Writers hold an
+# exclusive flock on gallery.lock across read-previous / write / replace; readers a shared one.
+# last_change is the GalleryChange.id the rows reflect (format 1 stored the highest user id instead).
+SNAPSHOT_FORMAT_VERSION = 3
+_MATRIX_MAGIC = b"FGALMTX1"
+_IDS_MAGIC = b"FGALIDS1"
+# magic, format, dim, rows, capacity, last_change, generation, created_at, write token
+_HEADER = struct.Struct("<8sIIQQqqdQ")
+_HEADER_SIZE = 64
+MATRIX_FILENAME = "gallery.f32"
+IDS_FILENAME = "gallery.ids"
+LOCK_FILENAME = "gallery.lock"
+
+
+@dataclass
+class GallerySnapshot:
+    """A mapped snapshot. `matrix` is a copy-on-write `np.memmap` over all `capacity` rows:
+    pages are shared with every process mapping the same file until a process writes to them."""
+    ids: np.ndarray
+    matrix: np.memmap
+    rows: int
+    last_change: int
+    generation: int
+    created_at: float
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+
+def snapshot_dir() -> Path:
+    """GALLERY_SNAPSHOT_DIR, resolved like FACE_IMAGE_DIR (relative to the working directory)."""
+    return Path.cwd() / settings.GALLERY_SNAPSHOT_DIR
+
+
+@contextmanager
+def _locked(directory: Path, exclusive: bool):
+    """Advisory flock on the directory's lock file (shared for readers, exclusive for writers)."""
+    if fcntl is None:
+        yield
+        return
+    with open(directory / LOCK_FILENAME, "a+b") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_snapshot(directory: Optional[Path] = None) -> Optional[GallerySnapshot]:
+    """Maps the snapshot in `directory`; None if missing, from another format version, or torn."""
+    directory = directory or snapshot_dir()
+    matrix_path, ids_path = directory / MATRIX_FILENAME, directory / IDS_FILENAME
+    if not matrix_path.is_file() or not ids_path.is_file():
+        return None
+    with _locked(directory, exclusive=False):
+        return _read_snapshot(directory, matrix_path, ids_path)
+
+
+def _read_snapshot(directory: Path, matrix_path: Path, ids_path: Path) -> Optional[GallerySnapshot]:
+    try:
+        # Open both once: the header checks and the data below then come from the same inodes
+        with open(matrix_path, "rb") as matrix_file, open(ids_path, "rb") as ids_file:
+            (m_magic, m_format, dim, rows, capacity, last_change, generation, created_at,
+             m_token) = _HEADER.unpack(matrix_file.read(_HEADER.size))
+            i_magic, i_format, _, i_rows, _, _, i_generation, _, i_token = _HEADER.unpack(ids_file.read(_HEADER.size))
+            if (m_magic, i_magic) != (_MATRIX_MAGIC, _IDS_MAGIC) or (m_format, i_format) != (SNAPSHOT_FORMAT_VERSION,) * 2:
+                logger.info(f"Ignoring gallery snapshot in {directory}: unknown format")
+                return None
+            if (i_rows, i_generation, i_token) != (rows, generation, m_token):
+                logger.warning(f"Ignoring gallery snapshot in {directory}: matrix and id files are from different writes")
+                return None
+            if dim == 0 or capacity < rows:
+                return None
+
+            matrix = np.memmap(matrix_file, dtype="<f4", mode="c", offset=_HEADER_SIZE, shape=(capacity, dim))
+            ids_file.seek(_HEADER_SIZE)
+            ids = np.fromfile(ids_file, dtype="<i8", count=rows)
+    except (OSError, struct.error, ValueError) as e:
+        logger.warning(f"Unreadable gallery snapshot in {directory}: {e}")
+        return None
+    return GallerySnapshot(ids, matrix, rows, last_change, generation, created_at)
+
+
+def write_snapshot(ids: np.ndarray, matrix: np.ndarray, last_change: int,
+                   directory: Optional[Path] = None, spare_rows: Optional[int] = None) -> int:
+    """Writes ids + normalized (N, D) rows atomically (temp files + rename); returns the new generation.
+
+    The matrix is padded with `spare_rows` zero rows (default: 10%, at least 1024) so processes
+    mapping it can add users in place without reallocating. Concurrent writers (every worker
+    saves at shutdown) are serialized by the directory lock.
+    """
+    directory = directory or snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    with _locked(directory, exclusive=True):
+        return _write_snapshot(ids, matrix, last_change, directory, spare_rows)
+
+
+def _write_snapshot(ids: np.ndarray, matrix: np.ndarray, last_change: int,
+                    directory: Path, spare_rows: Optional[int]) -> int:
+    previous = _read_snapshot(directory, directory / MATRIX_FILENAME, directory / IDS_FILENAME) \
+        if (directory / MATRIX_FILENAME).is_file() and (directory / IDS_FILENAME).is_file() else None
+    generation = previous.generation + 1 if previous is not None else 1
+    del previous
+    token = int.from_bytes(os.urandom(8), "little")
+
+    rows, dim = matrix.shape
+    capacity = rows + (spare_rows if spare_rows is not None else max(1024, rows // 10))
+    created_at = time.time()
+
+    matrix_path, ids_path = directory / MATRIX_FILENAME, directory / IDS_FILENAME
+    tmp_suffix = f".tmp{os.getpid()}"
+    matrix_tmp, ids_tmp = matrix_path.with_name(MATRIX_FILENAME + tmp_suffix), ids_path.with_name(IDS_FILENAME + tmp_suffix)
+
+    with open(matrix_tmp, "wb") as f:
+        f.write(_HEADER.pack(_MATRIX_MAGIC, SNAPSHOT_FORMAT_VERSION, dim, rows, capacity,
+                             last_change, generation, created_at, token).ljust(_HEADER_SIZE, b"\0"))
+        for start in range(0, rows, 65536):
+            f.write(np.ascontiguousarray(matrix[start:start + 65536], dtype="<f4").tobytes())
+        f.truncate(_HEADER_SIZE + capacity * dim * 4)
+    with open(ids_tmp, "wb") as f:
+        f.write(_HEADER.pack(_IDS_MAGIC, SNAPSHOT_FORMAT_VERSION, dim, rows, capacity,
+                             last_change, generation, created_at, token).ljust(_HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(ids, dtype="<i8").tobytes())
+
+    # Readers that already mapped the old files keep their (unlinked) inodes
+    os.replace(ids_tmp, ids_path)
+    os.replace(matrix_tmp, matrix_path)
+    return generation
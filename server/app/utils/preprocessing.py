@@ -1,67 +1,274 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, Optional, Union
+
 import cv2
 import numpy as np
-from fastapi import UploadFile
-from typing import Tuple, Optional, Union
+from loguru import logger
 from app.core.config import settings
+from app.core.metrics import stage
+from app.services.ai_service import ai_service
+
+# Back-off between YuNet creation attempts after a failure (doubling up to the max)
+DETECTOR_RETRY_INITIAL_SECONDS = 1.0
+DETECTOR_RETRY_MAX_SECONDS = 60.0
+
+# ArcFace 112x112 reference positions of the five YuNet landmarks, in YuNet order:
+# right eye, left eye, nose tip, right mouth corner, left mouth corner (subject's right = image left).
+ARCFACE_TEMPLATE_112 = np.array(
+    [
+        [38.2946, 51.6963],
+        [73.5318, 51.5014],
+        [56.0252, 71.7366],
+        [41.5493, 92.3655],
+        [70.7299, 92.2041],
+    ],
+    dtype=np.float32,
+)
+
+
+class DetectorPool:
+    """Thread-safe pool of YuNet detectors keyed by square input-size buckets.
+
+    Each detector is created with its bucket's input size and never reconfigured, so there is
+    no per-request `setInputSize` re-allocation. Images are letterboxed (zero-padded bottom/right,
+    so coordinates are unchanged) into the smallest bucket that fits. Up to `max_per_bucket`
+    detectors exist per bucket, one per compute worker; a thread holds one exclusively.
+
+    A failed `FaceDetectorYN.create` (e.g. the model file is missing or not yet mounted) makes the
+    pool unavailable only until a back-off expires, doubling per consecutive failure; the next
+    request after that retries, so detection comes back without a restart.
+    """
+
+    def __init__(self, buckets: List[int], max_per_bucket: int):
+        if not buckets:
+            raise ValueError("DetectorPool needs at least one input-size bucket")
+        self.buckets = sorted(set(buckets))
+        self.max_per_bucket = max(1, max_per_bucket)
+        self._idle: Dict[int, queue.SimpleQueue] = {b: queue.SimpleQueue() for b in self.buckets}
+        self._created: Dict[int, int] = {b: 0 for b in self.buckets}
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._retry_delay = 0.0
 
-detector: Optional[cv2.FaceDetectorYN] = None
+    @property
+    def available(self) -> bool:
+        """False while backing off after a failed detector creation."""
+        return time.monotonic() >= self._retry_at
 
+    @property
+    def max_side(self) -> int:
+        return self.buckets[-1]
+
+    def bucket_for(self, width: int, height: int) -> int:
+        """Smallest bucket side that fits the image; callers downscale to `max_side` first."""
+        longest = max(width, height)
+        for bucket in self.buckets:
+            if longest <= bucket:
+                return bucket
+        return self.max_side
+
+    @contextmanager
+    def acquire(self, bucket: int) -> Iterator[Optional[cv2.FaceDetectorYN]]:
+        """Yields an idle detector for the bucket (creating one if under the cap, else waiting); None if unavailable."""
+        detector = self._take(bucket)
+        try:
+            yield detector
+        finally:
+            if detector is not None:
+                self._idle[bucket].put(detector)
+
+    def _take(self, bucket: int) -> Optional[cv2.FaceDetectorYN]:
+        if not self.available:
+            return None
+        idle = self._idle[bucket]
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created[bucket] < self.max_per_bucket
+            if create:
+                self._created[bucket] += 1
+        if not create:
+            return idle.get()
 
-def get_face_detector() -> Optional[cv2.FaceDetectorYN]:
-    """Returns a lazy-loaded YuNet face detector singleton."""
-    global detector
-    if detector is None:
         try:
             detector = cv2.FaceDetectorYN.create(
                 model=settings.DETECTION_MODEL_PATH,
                 config="",
-                input_size=(320, 320),
+                input_size=(bucket, bucket),
                 score_threshold=settings.DETECTION_SCORE_THRESHOLD,
                 nms_threshold=settings.DETECTION_NMS_THRESHOLD,
                 top_k=5000
             )
         except Exception as e:
-            print(f"Failed to load YuNet model: {e}")
+            with self._lock:
+                self._created[bucket] -= 1
+                first_failure = self._retry_delay == 0.0
+                self._retry_delay = min(
+                    DETECTOR_RETRY_MAX_SECONDS, max(DETECTOR_RETRY_INITIAL_SECONDS, self._retry_delay * 2)
+                )
+                self._retry_at = time.monotonic() + self._retry_delay
+            if first_failure:
+                logger.error(f"Failed to load YuNet model: {e}; face detection off, retrying with back-off")
+            else:
+                logger.debug(f"YuNet model still failing to load, next retry in {self._retry_delay:.0f}s: {e}")
             return None
-    return detector
+
+        if self._retry_delay:
+            with self._lock:
+                self._retry_delay = 0.0
+            logger.info("YuNet model loaded; face detection restored")
+        return detector
+
+    def stats(self) -> dict:
+        return {
+            "buckets": self.buckets,
+            "detectors": {str(b): n for b, n in self._created.items()},
+            "available": self.available,
+        }
+
+
+detector_pool = DetectorPool(settings.DETECTION_INPUT_BUCKETS, settings.COMPUTE_POOL_WORKERS)
+
+
+def detect_faces(image: np.ndarray) -> Optional[np.ndarray]:
+    """Runs YuNet on the image; returns (N, 15) detections (box, 5 landmarks, score) sorted by score, best first.
+    Images larger than DETECTION_MAX_SIDE (or the largest detector bucket) are detected on a downscaled
+    copy, letterboxed into a pooled detector's fixed input size; boxes/landmarks are mapped back to
+    original-image coordinates so crops and alignment still use full resolution.
+    Returns None when the detector is unavailable and an empty (0, 15) array when no face is found."""
+    if not detector_pool.available:
+        return None
+
+    with stage("detect"):
+        h, w, _ = image.shape
+        scale = 1.0
+        detect_img = image
+        max_side = settings.DETECTION_MAX_SIDE
+        max_side = min(max_side, detector_pool.max_side) if max_side > 0 else detector_pool.max_side
+        if max(h, w) > max_side:
+            scale = max_side / max(h, w)
+            detect_img = cv2.resize(
+                image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA
+            )
+
+        dh, dw, _ = detect_img.shape
+        bucket = detector_pool.bucket_for(dw, dh)
+        letterboxed = cv2.copyMakeBorder(
+            detect_img, 0, bucket - dh, 0, bucket - dw, cv2.BORDER_CONSTANT, value=(0, 0, 0)
+        )
+        with detector_pool.acquire(bucket) as face_detector:
+            if face_detector is None:
+                return None
+            _, faces = face_detector.detect(letterboxed)
+
+    if faces is None or len(faces) == 0:
+        return np.empty((0, 15), dtype=np.float32)
+    if scale != 1.0:
+        faces = faces.copy()
+        faces[:, :14] /= scale
+    return faces[np.argsort(-faces[:, -1])]
+
+
+def crop_face(image: np.ndarray, face: np.ndarray) -> np.ndarray:
+    """Crops a YuNet detection's box (clamped to the image); falls back to the whole image if the crop is empty."""
+    h, w, _ = image.shape
+    box_x, box_y, box_w, box_h = map(int, face[:4])
+    box_x = max(0, box_x)
+    box_y = max(0, box_y)
+    box_w = min(w - box_x, box_w)
+    box_h = min(h - box_y, box_h)
+    cropped = image[box_y:box_y+box_h, box_x:box_x+box_w]
+    return cropped if cropped.size > 0 else image
+
+
+def align_face(image: np.ndarray, face: np.ndarray, target_size: Tuple[int, int] = (112, 112)) -> Optional[np.ndarray]:
+    """Warps the face straight from the full-resolution image onto the ArcFace landmark template.
+
+    Estimates a similarity transform (rotation, uniform scale, translation) from the five YuNet
+    landmarks and applies it with a single `cv2.warpAffine`, so no intermediate crop/resize copies
+    are made. Returns the aligned BGR uint8 face, or None if the transform cannot be estimated.
+    """
+    landmarks = np.asarray(face[4:14], dtype=np.float32).reshape(5, 2)
+    template = ARCFACE_TEMPLATE_112 * np.array(
+        [target_size[0] / 112.0, target_size[1] / 112.0], dtype=np.float32
+    )
+    matrix, _ = cv2.estimateAffinePartial2D(landmarks, template, method=cv2.LMEDS)
+    if matrix is None:
+        return None
+    return cv2.warpAffine(image, matrix, target_size, flags=cv2.INTER_LINEAR, borderValue=0)
+
+
+def extract_face(image: np.ndarray, face: Optional[np.ndarray], target_size: Tuple[int, int] = (112, 112)) -> np.ndarray:
+    """Returns the target_size BGR uint8 face for one detection: landmark-aligned when FACE_ALIGNMENT_ENABLED
+    (falling back to box crop + resize if alignment fails), box crop + resize otherwise, whole image if face is None."""
+    if face is None:
+        return cv2.resize(image, target_size)
+    if settings.FACE_ALIGNMENT_ENABLED:
+        aligned = align_face(image, face, target_size)
+        if aligned is not None:
+            return aligned
+    return cv2.resize(crop_face(image, face), target_size)
+
 
 def pre_process(
     image: np.ndarray,
     target_size: Tuple[int, int] = (112, 112),
     return_resized: bool = False,
 ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
-    """Detects face, crops it, then resizes and normalizes to NCHW for the embedding model.
-    When return_resized=True, also returns the resized BGR uint8 image (before normalization) for debug save."""
-    face_detector = get_face_detector()
-    if face_detector is None:
-        out = _resize_and_normalize(image, target_size)
-        if return_resized:
-            resized = cv2.resize(image, target_size)
-            return (out, resized)
-        return out
+    """Detects face, aligns (or crops and resizes) it, then converts it to the embedding model's input (see `_resize_and_normalize`).
+    When return_resized=True, also returns the 112x112 BGR uint8 face (before normalization) for debug save."""
+    faces = detect_faces(image)
+    best_face = faces[0] if faces is not None and len(faces) > 0 else None
+    with stage("align"):
+        face_img = extract_face(image, best_face, target_size)
+    with stage("normalize"):
+        tensor = _resize_and_normalize(face_img, target_size, pre_resized=face_img)
+    if return_resized:
+        return (tensor, face_img)
+    return tensor
 
-    h, w, _ = image.shape
-    face_detector.setInputSize((w, h))
-    _, faces = face_detector.detect(image)
-
-    face_img = image
-    if faces is not None and len(faces) > 0:
-        best_face_idx = np.argmax(faces[:, -1])
-        best_face = faces[best_face_idx]
-        box_x, box_y, box_w, box_h = map(int, best_face[:4])
-        box_x = max(0, box_x)
-        box_y = max(0, box_y)
-        box_w = min(w - box_x, box_w)
-        box_h = min(h - box_y, box_h)
-        cropped = image[box_y:box_y+box_h, box_x:box_x+box_w]
-        if cropped.size > 0:
-            face_img = cropped
 
-    if return_resized:
-        resized = cv2.resize(face_img, target_size)
-        tensor = _resize_and_normalize(face_img, target_size, pre_resized=resized)
-        return (tensor, resized)
-    return _resize_and_normalize(face_img, target_size)
+def pre_process_all(
+    image: np.ndarray,
+    target_size: Tuple[int, int] = (112, 112),
+    max_faces: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Aligns (or crops) every detected face (best score first, up to max_faces) into one model-input batch.
+
+    Returns:
+        (batch tensor, (N, 15) detections aligned with the batch rows). Both are empty if no face is found.
+
+    Raises:
+        RuntimeError: The face detector is not available.
+    """
+    faces = detect_faces(image)
+    if faces is None:
+        raise RuntimeError("Face detector is not available")
+    if max_faces is not None:
+        faces = faces[:max_faces]
+    return pre_process_faces(image, faces, target_size), faces
+
+
+def pre_process_faces(
+    image: np.ndarray,
+    faces: np.ndarray,
+    target_size: Tuple[int, int] = (112, 112),
+) -> np.ndarray:
+    """Aligns (or crops) the given (N, 15) detections into one model-input batch, without re-detecting."""
+    if len(faces) == 0:
+        return _empty_batch(target_size)
+    with stage("align"):
+        face_imgs = [extract_face(image, face, target_size) for face in faces]
+    with stage("normalize"):
+        return np.concatenate(
+            [_resize_and_normalize(f, target_size, pre_resized=f) for f in face_imgs], axis=0
+        )
 
 
 def _resize_and_normalize(
@@ -69,21 +276,91 @@ def _resize_and_normalize(
     size: Tuple[int, int],
     pre_resized: Optional[np.ndarray] = None,
 ) -> np.ndarray:
-    """Resizes to `size` (or uses pre_resized if given), BGR→RGB, normalizes to [-1, 1], returns NCHW (1, C, H, W) for ONNX."""
+    """Resizes to `size` (or uses pre_resized if given) and returns the model input for one face:
+    RGB (x - 127.5) / 128 as NCHW (1, C, H, W) float32, or the BGR crop itself as (1, H, W, 3) uint8
+    when the served model has that normalization fused in (scripts/fuse_preprocessing.py)."""
     resized = cv2.resize(img, size) if pre_resized is None else pre_resized
-    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-    normalized = (rgb.astype(np.float32) - 127.5) / 128.0
-    transposed = np.transpose(normalized, (2, 0, 1))
-    expanded = np.expand_dims(transposed, axis=0)
-    return expanded
-
-async def read_image_file(file: UploadFile) -> np.ndarray:
-    """Reads FastAPI UploadFile and decodes to OpenCV BGR image (NumPy array)."""
-    contents = await file.read()
+    if ai_service.input_uint8:
+        return np.ascontiguousarray(resized)[np.newaxis]
+    # One pass: channel swap, mean/scale and HWC->CHW
+    return cv2.dnn.blobFromImage(resized, scalefactor=1.0 / 128.0, mean=(127.5, 127.5, 127.5), swapRB=True)
+
+
+def _empty_batch(target_size: Tuple[int, int]) -> np.ndarray:
+    """Zero-face batch in the served model's input layout."""
+    if ai_service.input_uint8:
+        return np.empty((0, target_size[1], target_size[0], 3), dtype=np.uint8)
+    return np.empty((0, 3, target_size[1], target_size[0]), dtype=np.float32)
+
+
+def decode_image(contents: bytes) -> np.ndarray:
+    """Decodes encoded image bytes to an OpenCV BGR image (NumPy array).
+    JPEGs much larger than DECODE_MAX_SIDE are decoded at 1/2, 1/4 or 1/8 scale (libjpeg DCT scaling)."""
     nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    with stage("decode"):
+        img = cv2.imdecode(nparr, _decode_flag(contents))
     
     if img is None:
         raise ValueError("Failed to decode image file. Please check if it is a valid image.")
         
     return img
+
+
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(contents: bytes) -> Optional[Tuple[int, int]]:
+    """Reads (width, height) from the JPEG SOF header without decoding; None if not a parsable JPEG."""
+    if contents[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    n = len(contents)
+    while i + 9 < n:
+        if contents[i] != 0xFF:
+            return None
+        marker = contents[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = int.from_bytes(contents[i + 2:i + 4], "big")
+        if marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(contents[i + 5:i + 7], "big")
+            width = int.from_bytes(contents[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _decode_flag(contents: bytes) -> int:
+    """Picks the largest JPEG reduction that keeps the longest side >= DECODE_MAX_SIDE (IMREAD_COLOR if disabled)."""
+    max_side = settings.DECODE_MAX_SIDE
+    if max_side <= 0:
+        return cv2.IMREAD_COLOR
+    size = _jpeg_size(contents)
+    if size is None:
+        return cv2.IMREAD_COLOR
+    longest = max(size)
+    for factor, flag in _REDUCED_DECODE_FLAGS:
+        if longest // factor >= max_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_and_pre_process(contents: bytes, return_resized: bool = False):
+    """Decode + `pre_process` in one call so endpoints can hand the whole CPU-bound step to the compute pool.
+    Returns (image, tensor) or, with return_resized=True, (image, tensor, resized_bgr)."""
+    image = decode_image(contents)
+    if return_resized:
+        tensor, resized = pre_process(image, return_resized=True)
+        return image, tensor, resized
+    return image, pre_process(image)
+
+
+def decode_and_pre_process_all(contents: bytes, max_faces: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode + `pre_process_all` in one compute-pool hop; returns (batch tensor, detections)."""
+    return pre_process_all(decode_image(contents), max_faces=max_faces)
@@ -1,26 +1,34 @@
+import itertools
 import json
-from typing import List, Tuple, Union, Optional, Any
+import os
+import struct
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Type, Union, Optional, Any, Sequence
 import numpy as np
 
-from app.db.models import User
+# Binary embedding layout: 4-byte header (magic, dtype code, pad), then for int8 a
+# little-endian float32 scale, then the little-endian vector. Offsets stay 4-byte aligned.
+_EMBEDDING_MAGIC = b"FE"
+_EMBEDDING_HEADER = struct.Struct("<2sBx")
+_EMBEDDING_SCALE = struct.Struct("<f")
+_EMBEDDING_DTYPES = {"float32": (1, np.dtype("<f4")), "float16": (2, np.dtype("<f2")), "int8": (3, np.dtype("i1"))}
+_EMBEDDING_CODES = {code: (name, dtype) for name, (code, dtype) in _EMBEDDING_DTYPES.items()}
 
-def cosine_similarity(v1: Union[str, List[float], np.ndarray], v2: Union[str, List[float], np.ndarray]) -> float:
-    """Computes cosine similarity between two vectors (supports JSON string from DB).
+EmbeddingLike = Union[bytes, memoryview, str, List[float], np.ndarray]
+
+def cosine_similarity(v1: EmbeddingLike, v2: EmbeddingLike) -> float:
+    """Computes cosine similarity between two vectors (supports binary blob or JSON string from DB).
 
     Args:
-        v1: First vector (JSON string, list, or NumPy array).
-        v2: Second vector (JSON string, list, or NumPy array).
+        v1: First vector (blob, JSON string, list, or NumPy array).
+        v2: Second vector (blob, JSON string, list, or NumPy array).
 
     Returns:
         Cosine similarity in [-1.0, 1.0].
     """
-    if isinstance(v1, str):
-        v1 = json.loads(v1)
-    if isinstance(v2, str):
-        v2 = json.loads(v2)
-
-    vec1: np.ndarray = np.array(v1, dtype=np.float32).flatten()
-    vec2: np.ndarray = np.array(v2, dtype=np.float32).flatten()
+    vec1: np.ndarray = decode_embedding(v1)
+    vec2: np.ndarray = decode_embedding(v2)
 
     dot_product: float = float(np.dot(vec1, vec2))
     norm_vec1: float = float(np.linalg.norm(vec1))
@@ -30,30 +38,805 @@ def cosine_similarity(v1: Union[str, List[float], np.ndarray], v2: Union[str, Li
         return 0.0
     
     return float(dot_product / (norm_vec1 * norm_vec2))
-    
-def find_best_match(
-    target_embedding: Union[str, List[float], np.ndarray],
-    user_list: List[User]
-) -> Tuple[Optional[User], float]:
-    """Finds the user whose face embedding is most similar to the target vector.
+
+
+def encode_embedding(vector: Union[List[float], np.ndarray], dtype: str = "float32") -> bytes:
+    """Serializes an embedding to the compact binary form stored in `User.face_embedding`.
 
     Args:
-        target_embedding: Query embedding (JSON string, list, or array).
-        user_list: List of `User` objects to compare against.
+        vector: Embedding (any shape; flattened).
+        dtype: "float32" (lossless), "float16", or "int8" (symmetric, per-vector scale).
 
     Returns:
-        (Best-matching user or None, similarity score).
+        Header + little-endian payload bytes.
+    """
+    if dtype not in _EMBEDDING_DTYPES:
+        raise ValueError(f"Unsupported embedding storage dtype: {dtype}")
+    code, np_dtype = _EMBEDDING_DTYPES[dtype]
+    vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+    header = _EMBEDDING_HEADER.pack(_EMBEDDING_MAGIC, code)
+
+    if dtype == "int8":
+        max_abs = float(np.max(np.abs(vec))) if vec.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(vec / scale), -127, 127).astype(np_dtype)
+        return header + _EMBEDDING_SCALE.pack(scale) + quantized.tobytes()
+    return header + vec.astype(np_dtype, copy=False).tobytes()
+
+
+def decode_embedding(raw: EmbeddingLike) -> np.ndarray:
+    """Decodes a stored or freshly inferred embedding into a flat float32 vector.
+
+    float32 blobs are returned as a read-only `np.frombuffer` view over the DB bytes (no copy);
+    float16/int8 blobs are widened to float32.
+
+    Args:
+        raw: Binary blob or legacy JSON string from DB, (nested) list from `ModelService.inference`, or array.
+
+    Returns:
+        1-D float32 array.
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        magic, code = _EMBEDDING_HEADER.unpack_from(raw)
+        if magic != _EMBEDDING_MAGIC or code not in _EMBEDDING_CODES:
+            raise ValueError("Unrecognized embedding blob header")
+        name, np_dtype = _EMBEDDING_CODES[code]
+        offset = _EMBEDDING_HEADER.size
+        if name == "int8":
+            (scale,) = _EMBEDDING_SCALE.unpack_from(raw, offset)
+            quantized = np.frombuffer(raw, dtype=np_dtype, offset=offset + _EMBEDDING_SCALE.size)
+            return quantized.astype(np.float32) * np.float32(scale)
+        values = np.frombuffer(raw, dtype=np_dtype, offset=offset)
+        return values if name == "float32" else values.astype(np.float32)
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return np.asarray(raw, dtype=np.float32).reshape(-1)
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes the last axis; zero vectors stay zero so they score 0.0 against everything."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns indices of the k highest scores along the last axis, best first.
+
+    Uses `argpartition` so only the k selected scores are sorted, not the whole vector.
+    Works for a single (N,) score vector or a (M, N) matrix of per-query scores.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class SearchBackend(ABC):
+    """Interface for gallery nearest-neighbour search over cosine similarity.
+
+    Implementations keep ids aligned with L2-normalized embeddings, support incremental
+    add/remove, and round-trip through `save` / `load_search_backend`. Not thread-safe;
+    callers (`GalleryService`) lock.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def __contains__(self, item_id: int) -> bool: ...
+
+    @abstractmethod
+    def build(self, ids: Sequence[int], vectors: Union[Sequence[EmbeddingLike], np.ndarray]) -> None:
+        """Replaces the whole index with the given ids and embeddings."""
+
+    @abstractmethod
+    def add(self, item_id: int, vector: EmbeddingLike) -> None:
+        """Adds an embedding, or replaces it if `item_id` is already indexed."""
+
+    @abstractmethod
+    def remove(self, item_id: int) -> bool:
+        """Removes an id; returns False if absent."""
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    @property
+    def needs_training(self) -> bool:
+        """True when enough rows were added to an untrained index that a (re)build would train it.
+        `add` never trains inline; `GalleryService` rebuilds such an index off the request path."""
+        return False
+
+    @abstractmethod
+    def search(self, query: EmbeddingLike, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (ids, cosine similarities) of the k nearest rows, best first."""
+
+    def search_batch(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Searches (M, D) queries; returns (M, k') ids and similarities, best first, padded with -1 / -inf."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        results = [self.search(q, k) for q in queries]
+        width = max((len(ids) for ids, _ in results), default=0)
+        out_ids = np.full((len(queries), width), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), width), -np.inf, dtype=np.float32)
+        for row, (ids, scores) in enumerate(results):
+            out_ids[row, :len(ids)] = ids
+            out_scores[row, :len(scores)] = scores
+        return out_ids, out_scores
+
+    @abstractmethod
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays that fully describe the index, for `save`."""
+
+    @classmethod
+    @abstractmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **options: Any) -> "SearchBackend":
+        """Rebuilds an index from `state()` output; `options` are runtime-only settings (e.g. file paths)."""
+
+    def save(self, path: str) -> None:
+        """Writes the index to an .npz file atomically (per-process temp file + rename)."""
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, backend=np.array(self.name), **self.state())
+        os.replace(tmp_path, path)
+
+
+class EmbeddingIndex(SearchBackend):
+    """Exact in-memory cosine index over a contiguous, pre-L2-normalized float32 matrix.
+
+    The reference search backend: rows live packed in the first `len(self)` slots of a
+    growable buffer, with a parallel id array, so a query is one matrix-vector product.
+    """
+
+    name = "exact"
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.dim: Optional[int] = None
+        self._initial_capacity = initial_capacity
+        self._vectors: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Active (N, D) normalized embedding rows (a view, not a copy)."""
+        return self._vectors[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Ids aligned with `matrix` rows (a view, not a copy)."""
+        return self._ids[:self._size]
+
+    def build(self, ids: Sequence[int], vectors: Union[Sequence[EmbeddingLike], np.ndarray]) -> None:
+        """Replaces the whole index with the given ids and embeddings (blobs, or an (N, D) array)."""
+        self.clear()
+        if len(ids) == 0:
+            return
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            matrix = l2_normalize(vectors)
+        else:
+            matrix = l2_normalize(np.stack([decode_embedding(v) for v in vectors]))
+        self.dim = matrix.shape[1]
+        capacity = max(self._initial_capacity, len(ids))
+        self._vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._vectors[:len(ids)] = matrix
+        self._ids[:len(ids)] = ids
+        self._rows = {int(item_id): row for row, item_id in enumerate(ids)}
+        self._size = len(ids)
+
+    def attach(self, ids: np.ndarray, buffer: np.ndarray, size: int) -> None:
+        """Adopts an existing (capacity, D) buffer of normalized rows without copying, e.g. a
+        copy-on-write `np.memmap` snapshot; its first `size` rows are live and aligned with `ids`."""
+        self.dim = buffer.shape[1]
+        self._vectors = buffer
+        self._ids = np.empty(buffer.shape[0], dtype=np.int64)
+        self._ids[:size] = ids[:size]
+        self._rows = {int(item_id): row for row, item_id in enumerate(ids[:size])}
+        self._size = size
+
+    def add(self, item_id: int, vector: EmbeddingLike) -> None:
+        """Adds an embedding, or replaces it if `item_id` is already indexed."""
+        vec = l2_normalize(decode_embedding(vector))
+        if self.dim is None:
+            self.dim = vec.shape[0]
+        elif vec.shape[0] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {vec.shape[0]}")
+
+        row = self._rows.get(item_id)
+        if row is None:
+            self._reserve(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._rows[item_id] = row
+            self._ids[row] = item_id
+        self._vectors[row] = vec
+
+    def remove(self, item_id: int) -> bool:
+        """Removes an id by moving the last row into its slot; returns False if absent."""
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return False
+        last = self._size - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size = last
+        return True
+
+    def clear(self) -> None:
+        self._rows = {}
+        self._size = 0
+
+    def search(self, query: EmbeddingLike, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (ids, cosine similarities) of the k nearest rows, best first."""
+        if self._size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = l2_normalize(decode_embedding(query))
+        scores = self.matrix @ q
+        top = top_k_indices(scores, k)
+        return self.ids[top], scores[top]
+
+    def search_batch(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores (M, D) queries with one matrix-matrix product; returns (M, k) ids and similarities, best first."""
+        queries = l2_normalize(np.asarray(queries, dtype=np.float32).reshape(len(queries), -1))
+        if self._size == 0:
+            empty = (len(queries), 0)
+            return np.empty(empty, dtype=np.int64), np.empty(empty, dtype=np.float32)
+        scores = queries @ self.matrix.T
+        top = top_k_indices(scores, k)
+        return self.ids[top], np.take_along_axis(scores, top, axis=-1)
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self._vectors.shape[0]:
+            return
+        new_capacity = max(capacity, self._initial_capacity, self._vectors.shape[0] * 2)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        if self._size:
+            vectors[:self._size] = self.matrix
+            ids[:self._size] = self.ids
+        self._vectors = vectors
+        self._ids = ids
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"ids": self.ids, "vectors": self.matrix}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **options: Any) -> "EmbeddingIndex":
+        index = cls()
+        index.build(state["ids"], state["vectors"])
+        return index
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0, chunk_size: int = 65536
+) -> np.ndarray:
+    """Clusters L2-normalized rows by cosine similarity; returns (n_clusters, D) normalized centroids.
+
+    Empty clusters are re-seeded from random rows each iteration.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = nearest_centroids(vectors, centroids, chunk_size)
+        order = np.argsort(assign, kind="stable")
+        clusters, starts = np.unique(assign[order], return_index=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        empty = np.setdiff1d(np.arange(n_clusters), clusters)
+        centroids[clusters] = l2_normalize(sums)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Index of the highest-cosine centroid per row, computed in chunks to bound the score matrix."""
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        assign[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assign
+
+
+class IVFIndex(SearchBackend):
+    """Inverted-file approximate index: a k-means coarse quantizer plus one exact list per centroid.
+
+    A query scores the `nlist` centroids, then only the rows in the `nprobe` closest lists,
+    so cost is roughly nlist + N * nprobe / nlist dot products instead of N. Each inverted
+    list is an `EmbeddingIndex`, so add/remove stay O(1). Until `min_train_size` rows have
+    been seen the index is untrained and searches exactly over a single list; it trains
+    on the first `build` that reaches that size (`add` only raises `needs_training`).
+    Centroids are kept as trained; call `train` again after heavy churn.
     """
-    best_user: Optional[User] = None
-    max_similarity: float = -1.0
 
-    for user in user_list:
-        similarity: float = cosine_similarity(target_embedding, user.face_embedding)
-        if similarity > max_similarity:
-            max_similarity = similarity
-            best_user = user
-            
-    return best_user, max_similarity
+    name = "ivf"
+
+    def __init__(self, nlist: int = 1024, nprobe: int = 32, min_train_size: Optional[int] = None,
+                 max_train_size: Optional[int] = None, n_iter: int = 20, seed: int = 0):
+        self.nlist = max(1, nlist)
+        self.nprobe = max(1, nprobe)
+        self.min_train_size = min_train_size if min_train_size is not None else self.nlist * 16
+        self.max_train_size = max_train_size if max_train_size is not None else self.nlist * 256
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[EmbeddingIndex] = [self._new_list()]
+        self._list_of: Dict[int, int] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def dim(self) -> Optional[int]:
+        if self.centroids is not None:
+            return self.centroids.shape[1]
+        return self._lists[0].dim
+
+    def __len__(self) -> int:
+        return len(self._list_of)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._list_of
+
+    def build(self, ids: Sequence[int], vectors: Union[Sequence[EmbeddingLike], np.ndarray]) -> None:
+        """Replaces the contents; trains the quantizer first if untrained and there are enough rows.
+
+        A quantizer that is already trained (e.g. restored from disk) is reused as is.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            matrix = l2_normalize(vectors)
+        elif len(ids):
+            matrix = l2_normalize(np.stack([decode_embedding(v) for v in vectors]))
+        else:
+            matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+
+        if not self.is_trained and len(ids) >= self.min_train_size:
+            self.train(matrix)
+        self._assign_all(ids, matrix)
+
+    def train(self, matrix: Optional[np.ndarray] = None) -> None:
+        """Fits the coarse quantizer on `matrix` (default: current contents) and reassigns every row."""
+        if matrix is None:
+            ids, matrix = self._all_rows()
+        else:
+            ids = None
+        if len(matrix) == 0:
+            return
+        rng = np.random.default_rng(self.seed)
+        sample = matrix
+        if len(matrix) > self.max_train_size:
+            sample = matrix[rng.choice(len(matrix), self.max_train_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, self.nlist, self.n_iter, self.seed)
+        if ids is not None:
+            self._assign_all(ids, matrix)
+
+    def add(self, item_id: int, vector: EmbeddingLike) -> None:
+        vec = l2_normalize(decode_embedding(vector))
+        if self.dim is not None and vec.shape[0] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {vec.shape[0]}")
+        list_no = int(np.argmax(self.centroids @ vec)) if self.is_trained else 0
+        previous = self._list_of.get(item_id)
+        if previous is not None and previous != list_no:
+            self._lists[previous].remove(item_id)
+        self._lists[list_no].add(item_id, vec)
+        self._list_of[item_id] = list_no
+
+    @property
+    def needs_training(self) -> bool:
+        return not self.is_trained and len(self) >= self.min_train_size
+
+    def remove(self, item_id: int) -> bool:
+        list_no = self._list_of.pop(item_id, None)
+        if list_no is None:
+            return False
+        return self._lists[list_no].remove(item_id)
+
+    def clear(self) -> None:
+        for inverted_list in self._lists:
+            inverted_list.clear()
+        self._list_of = {}
+
+    def search(self, query: EmbeddingLike, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = l2_normalize(decode_embedding(query))
+        if self.is_trained:
+            probes = top_k_indices(self.centroids @ q, self.nprobe)
+        else:
+            probes = [0]
+
+        ids, scores = [], []
+        for list_no in probes:
+            inverted_list = self._lists[list_no]
+            if len(inverted_list):
+                ids.append(inverted_list.ids)
+                scores.append(inverted_list.matrix @ q)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        top = top_k_indices(scores, k)
+        return ids[top], scores[top]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        ids, matrix = self._all_rows()
+        state = {
+            "ids": ids,
+            "vectors": matrix,
+            "params": np.array([self.nlist, self.nprobe, self.min_train_size, self.max_train_size,
+                                self.n_iter, self.seed], dtype=np.int64),
+        }
+        if self.centroids is not None:
+            state["centroids"] = self.centroids
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **options: Any) -> "IVFIndex":
+        nlist, nprobe, min_train_size, max_train_size, n_iter, seed = (int(v) for v in state["params"])
+        index = cls(nlist, nprobe, min_train_size, max_train_size, n_iter, seed)
+        if "centroids" in state:
+            index.centroids = np.ascontiguousarray(state["centroids"], dtype=np.float32)
+        index._assign_all(state["ids"], state["vectors"])
+        return index
+
+    def _assign_all(self, ids: np.ndarray, matrix: np.ndarray) -> None:
+        if not self.is_trained:
+            self._lists = [self._new_list()]
+            self._lists[0].build(ids, matrix)
+            self._list_of = {int(item_id): 0 for item_id in ids}
+            return
+
+        assign = nearest_centroids(matrix, self.centroids) if len(ids) else np.empty(0, dtype=np.int64)
+        self._lists = [self._new_list() for _ in range(len(self.centroids))]
+        order = np.argsort(assign, kind="stable")
+        clusters, starts = np.unique(assign[order], return_index=True)
+        for list_no, rows in zip(clusters, np.split(order, starts[1:])):
+            self._lists[list_no].build(ids[rows], matrix[rows])
+        self._list_of = dict(zip(ids.tolist(), assign.tolist()))
+
+    def _all_rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        filled = [inverted_list for inverted_list in self._lists if len(inverted_list)]
+        if not filled:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        return (np.concatenate([inverted_list.ids for inverted_list in filled]),
+                np.concatenate([inverted_list.matrix for inverted_list in filled]))
+
+    @staticmethod
+    def _new_list() -> EmbeddingIndex:
+        return EmbeddingIndex(initial_capacity=16)
+
+
+def kmeans_l2(vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Euclidean k-means (used per PQ subspace); returns (n_clusters, D) centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+        assign = np.argmax(vectors @ centroids.T - 0.5 * np.einsum("kd,kd->k", centroids, centroids), axis=1)
+        order = np.argsort(assign, kind="stable")
+        clusters, starts, counts = np.unique(assign[order], return_index=True, return_counts=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[clusters] = sums / counts[:, None]
+        empty = np.setdiff1d(np.arange(n_clusters), clusters)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+class ProductQuantizer:
+    """Splits D-dim vectors into `m` sub-vectors and codes each as one of 256 sub-centroids (1 byte).
+
+    Inner products against a query use asymmetric distance computation (ADC): the query
+    stays in float, a per-query (m, 256) lookup table holds its dot product with every
+    sub-centroid, and a code's score is the sum of m table entries.
+    """
+
+    def __init__(self, m: int = 64, ksub: int = 256):
+        if not 1 <= ksub <= 256:
+            raise ValueError("ksub must be in [1, 256] so codes fit in uint8")
+        self.m = m
+        self.ksub = ksub
+        self.codebooks: Optional[np.ndarray] = None  # (m, ksub, dsub)
+
+    @property
+    def dsub(self) -> int:
+        return self.codebooks.shape[2]
+
+    def train(self, vectors: np.ndarray, n_iter: int = 20, seed: int = 0) -> None:
+        dim = vectors.shape[1]
+        if dim % self.m != 0:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by PQ m={self.m}")
+        dsub = dim // self.m
+        ksub = min(self.ksub, len(vectors))
+        self.codebooks = np.stack([
+            kmeans_l2(np.ascontiguousarray(vectors[:, j * dsub:(j + 1) * dsub]), ksub, n_iter, seed + j)
+            for j in range(self.m)
+        ]).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """(N, D) float -> (N, m) uint8 codes."""
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            sub = vectors[:, j * self.dsub:(j + 1) * self.dsub]
+            codes[:, j] = np.argmax(sub @ codebook.T - 0.5 * np.einsum("kd,kd->k", codebook, codebook), axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """(N, m) codes -> (N, D) reconstructed vectors."""
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def lookup_table(self, query: np.ndarray) -> np.ndarray:
+        """(m, ksub) dot products of each query sub-vector with every sub-centroid."""
+        return np.einsum("jd,jkd->jk", query.reshape(self.m, self.dsub), self.codebooks)
+
+
+# Where PQ re-rank rows are memory-mapped unless a path is given (per-process files, see `_grow_vectors`)
+DEFAULT_PQ_VECTORS_PATH = os.path.join(tempfile.gettempdir(), "face_pq_vectors")
+# Rows scored per ADC gather: bounds the (m, chunk) index temporary while keeping numpy calls few
+_ADC_CHUNK_ROWS = 8192
+
+
+class PQIndex(SearchBackend):
+    """Product-quantized index: ADC scan over compact codes, then exact float re-rank of the best candidates.
+
+    Codes are kept column-major ((m, capacity) uint8). Only the codes and ids are in anonymous
+    memory (m + 8 bytes per identity); the float32 rows used for re-ranking are a file-backed
+    `np.memmap` under `vectors_path` (default: the temp dir), so the kernel keeps just the pages
+    re-ranking touches and can drop them under pressure. `in_memory=True` keeps them in RAM
+    instead (2 KB per 512-d identity on top of the codes). Until `min_train_size` rows have been
+    seen the index is untrained and scans those float rows exactly; `build` trains it, `add`
+    only raises `needs_training`.
+    """
+
+    name = "pq"
+
+    def __init__(self, m: int = 64, rerank: int = 100, vectors_path: Optional[str] = None,
+                 min_train_size: int = 4096, max_train_size: int = 32768, n_iter: int = 10, seed: int = 0,
+                 in_memory: bool = False):
+        self.pq = ProductQuantizer(m)
+        self.rerank = max(0, rerank)
+        # None: re-rank rows in RAM
+        self.vectors_path = None if in_memory else (vectors_path or DEFAULT_PQ_VECTORS_PATH)
+        self.min_train_size = min_train_size
+        self.max_train_size = max_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.dim: Optional[int] = None
+        self._codes = np.empty((m, 0), dtype=np.uint8)
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.pq.codebooks is not None
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._rows
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes of the search structures. `vectors` is anonymous RAM (0 when memory-mapped);
+        `vectors_mapped` is the file-backed re-rank data, resident only as far as it is paged in."""
+        return {
+            "codes": self._size * self.pq.m,
+            "ids": self._ids[:self._size].nbytes,
+            "vectors": 0 if self.vectors_path else self.matrix.nbytes,
+            "vectors_mapped": self.matrix.nbytes if self.vectors_path else 0,
+            "codebooks": self.pq.codebooks.nbytes if self.is_trained else 0,
+        }
+
+    def build(self, ids: Sequence[int], vectors: Union[Sequence[EmbeddingLike], np.ndarray]) -> None:
+        """Replaces the contents; trains the codebooks first if untrained and there are enough rows."""
+        self.clear()
+        if len(ids) == 0:
+            return
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            matrix = l2_normalize(vectors)
+        else:
+            matrix = l2_normalize(np.stack([decode_embedding(v) for v in vectors]))
+        self.dim = matrix.shape[1]
+        self._reserve(len(ids))
+        self._vectors[:len(ids)] = matrix
+        self._ids[:len(ids)] = ids
+        self._rows = {int(item_id): row for row, item_id in enumerate(ids)}
+        self._size = len(ids)
+        if self.is_trained:
+            self._codes[:, :self._size] = self.pq.encode(matrix).T
+        elif self._size >= self.min_train_size:
+            self.train()
+
+    def train(self) -> None:
+        """Fits the codebooks on (a sample of) the current rows and re-encodes all of them."""
+        if self._size == 0:
+            return
+        rng = np.random.default_rng(self.seed)
+        sample = self.matrix
+        if self._size > self.max_train_size:
+            sample = sample[np.sort(rng.choice(self._size, self.max_train_size, replace=False))]
+        self.pq.train(np.asarray(sample), self.n_iter, self.seed)
+        for start in range(0, self._size, 65536):
+            end = min(self._size, start + 65536)
+            self._codes[:, start:end] = self.pq.encode(self.matrix[start:end]).T
+
+    def add(self, item_id: int, vector: EmbeddingLike) -> None:
+        vec = l2_normalize(decode_embedding(vector))
+        if self.dim is None:
+            self.dim = vec.shape[0]
+        elif vec.shape[0] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {vec.shape[0]}")
+
+        row = self._rows.get(item_id)
+        if row is None:
+            self._reserve(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._rows[item_id] = row
+            self._ids[row] = item_id
+        self._vectors[row] = vec
+        if self.is_trained:
+            self._codes[:, row] = self.pq.encode(vec[None, :])[0]
+
+    @property
+    def needs_training(self) -> bool:
+        return not self.is_trained and self._size >= self.min_train_size
+
+    def remove(self, item_id: int) -> bool:
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return False
+        last = self._size - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._codes[:, row] = self._codes[:, last]
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size = last
+        return True
+
+    def clear(self) -> None:
+        self._rows = {}
+        self._size = 0
+
+    def adc_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products of a normalized query with every stored code.
+
+        One gather per chunk of rows from the flattened (m * 256) lookup table, with each
+        subquantizer's codes offset into its own 256-entry block, then a sum over subquantizers."""
+        table = self.pq.lookup_table(query).astype(np.float32).ravel()
+        offsets = (np.arange(self.pq.m, dtype=np.intp) * self.pq.codebooks.shape[1])[:, None]
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, _ADC_CHUNK_ROWS):
+            end = min(self._size, start + _ADC_CHUNK_ROWS)
+            np.take(table, self._codes[:, start:end] + offsets).sum(axis=0, out=scores[start:end])
+        return scores
+
+    def search(self, query: EmbeddingLike, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        if self._size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = l2_normalize(decode_embedding(query))
+        if not self.is_trained:
+            scores = self.matrix @ q
+            top = top_k_indices(scores, k)
+            return self.ids[top], scores[top]
+
+        approx = self.adc_scores(q)
+        if self.rerank <= 0:
+            top = top_k_indices(approx, k)
+            return self.ids[top], approx[top]
+        candidates = np.sort(top_k_indices(approx, max(k, self.rerank)))
+        exact = self._vectors[candidates] @ q
+        top = top_k_indices(exact, k)
+        return self.ids[candidates[top]], exact[top]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        state = {
+            "ids": self.ids,
+            "vectors": np.asarray(self.matrix),
+            "params": np.array([self.pq.m, self.rerank, self.min_train_size, self.max_train_size,
+                                self.n_iter, self.seed], dtype=np.int64),
+        }
+        if self.is_trained:
+            state["codebooks"] = self.pq.codebooks
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], vectors_path: Optional[str] = None, in_memory: bool = False,
+                   **options: Any) -> "PQIndex":
+        m, rerank, min_train_size, max_train_size, n_iter, seed = (int(v) for v in state["params"])
+        index = cls(m, rerank, vectors_path, min_train_size, max_train_size, n_iter, seed, in_memory)
+        if "codebooks" in state:
+            index.pq.codebooks = np.ascontiguousarray(state["codebooks"], dtype=np.float32)
+        index.build(state["ids"], state["vectors"])
+        return index
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self._ids):
+            return
+        new_capacity = max(capacity, 1024, len(self._ids) * 2)
+        codes = np.empty((self.pq.m, new_capacity), dtype=np.uint8)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        codes[:, :self._size] = self._codes[:, :self._size]
+        ids[:self._size] = self.ids
+        self._codes, self._ids = codes, ids
+        self._vectors = self._grow_vectors(new_capacity)
+
+    def _grow_vectors(self, capacity: int) -> np.ndarray:
+        if self.vectors_path is None:
+            vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            if self._size:
+                vectors[:self._size] = self.matrix
+            return vectors
+        # A private file per process and growth: every worker builds its own index, and reusing the
+        # shared PQ_VECTORS_PATH would truncate the rows the other workers have mapped. The file is
+        # unlinked once mapped (pages stay file-backed, nothing is left behind after exit).
+        path = f"{self.vectors_path}.{os.getpid()}.{next(_VECTOR_FILE_SEQ)}"
+        with open(path, "w+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        try:
+            os.unlink(path)
+        except OSError:  # Windows cannot unlink a mapped file; it is left next to PQ_VECTORS_PATH
+            pass
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+        return vectors
+
+
+_VECTOR_FILE_SEQ = itertools.count()
+
+
+SEARCH_BACKENDS: Dict[str, Type[SearchBackend]] = {
+    EmbeddingIndex.name: EmbeddingIndex,
+    IVFIndex.name: IVFIndex,
+    PQIndex.name: PQIndex,
+}
+
+
+def create_search_backend(name: str, **options: Any) -> SearchBackend:
+    """Instantiates a search backend by name ("exact" | "ivf" | "pq"); options go to its constructor."""
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend: {name} (expected one of {sorted(SEARCH_BACKENDS)})")
+    return SEARCH_BACKENDS[name](**options)
 
 
-    
\ No newline at end of file
+def load_search_backend(path: str, **options: Any) -> SearchBackend:
+    """Restores an index written by `SearchBackend.save`; `options` go to the backend's `from_state`."""
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    name = str(state.pop("backend"))
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend in {path}: {name}")
+    return SEARCH_BACKENDS[name].from_state(state, **options)
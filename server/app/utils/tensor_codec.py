@@ -0,0 +1,69 @@
+import io
+from typing import Optional, Tuple
+
+import numpy as np
+
+TENSOR_CONTENT_TYPE = "application/octet-stream"
+NPY_CONTENT_TYPE = "application/x-npy"
+SHAPE_HEADER = "X-Tensor-Shape"
+DTYPE_HEADER = "X-Tensor-Dtype"
+
+# Little-endian only (every client we serve is x86 / ARM); uint8 feeds models with normalization
+# fused in (NHWC BGR crops, see scripts/fuse_preprocessing.py)
+TENSOR_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2"), "uint8": np.dtype("u1")}
+_NPY_MAGIC = b"\x93NUMPY"
+
+
+def parse_shape(value: Optional[str]) -> Tuple[int, ...]:
+    """Parses an X-Tensor-Shape header such as "1,3,112,112" (also "1x3x112x112" or "[1, 3, 112, 112]")."""
+    if not value:
+        raise ValueError(f"{SHAPE_HEADER} header is required for {TENSOR_CONTENT_TYPE} bodies")
+    parts = value.strip().strip("[]()").replace("x", ",").split(",")
+    try:
+        shape = tuple(int(p) for p in parts if p.strip())
+    except ValueError:
+        raise ValueError(f"Invalid {SHAPE_HEADER}: {value!r}")
+    if not shape or any(d <= 0 for d in shape):
+        raise ValueError(f"Invalid {SHAPE_HEADER}: {value!r}")
+    return shape
+
+
+def decode_raw_tensor(body: bytes, shape_header: Optional[str], dtype_header: Optional[str]) -> np.ndarray:
+    """Wraps a raw C-order body as an array without copying (read-only view over `body`)."""
+    dtype_name = (dtype_header or "float32").strip().lower()
+    if dtype_name not in TENSOR_DTYPES:
+        raise ValueError(f"Unsupported {DTYPE_HEADER}: {dtype_name!r} (expected one of {sorted(TENSOR_DTYPES)})")
+    dtype = TENSOR_DTYPES[dtype_name]
+    shape = parse_shape(shape_header)
+    expected = int(np.prod(shape)) * dtype.itemsize
+    if len(body) != expected:
+        raise ValueError(f"Body is {len(body)} bytes but shape {list(shape)} of {dtype_name} needs {expected}")
+    return np.frombuffer(body, dtype=dtype).reshape(shape)
+
+
+def decode_npy(body: bytes) -> np.ndarray:
+    """Reads a .npy body (format 1.0 or 2.0) as a read-only view over `body`, without copying the data."""
+    if not body.startswith(_NPY_MAGIC):
+        raise ValueError("Body is not a .npy file")
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        # Only the header is parsed (numpy's own validating reader); the data never goes through np.load
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        else:
+            raise ValueError(f"unsupported .npy format version {version[0]}.{version[1]}")
+    except ValueError as e:
+        raise ValueError(f"Invalid .npy header: {e}")
+
+    if dtype not in TENSOR_DTYPES.values():
+        raise ValueError(f"Unsupported .npy dtype {dtype.str} (expected little-endian float32, float16 or uint8)")
+    if fortran_order:
+        raise ValueError("Fortran-ordered .npy arrays are not supported")
+    offset = stream.tell()
+    expected = int(np.prod(shape)) * dtype.itemsize
+    if len(body) - offset != expected:
+        raise ValueError(f".npy data is {len(body) - offset} bytes but shape {list(shape)} needs {expected}")
+    return np.frombuffer(body, dtype=dtype, offset=offset).reshape(shape)
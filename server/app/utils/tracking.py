@@ -0,0 +1,132 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.recognition import l2_normalize
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """(N, M) intersection-over-union of two sets of [x, y, w, h] boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, 0, None], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, 1, None], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+@dataclass
+class Track:
+    """One face followed across frames. `face` is the latest YuNet row (box, landmarks, score)."""
+    track_id: int
+    face: np.ndarray
+    hits: int = 1
+    misses: int = 0
+    # Running (L2-normalized) mean of the embeddings taken so far, and when / at what detection score
+    # the last one was taken; see IoUTracker.due_for_embedding
+    embedding: Optional[np.ndarray] = None
+    embedded_at: float = 0.0
+    embedded_score: float = 0.0
+    embeddings: int = 0
+    # Identity of the smoothed embedding, filled in by the caller after the gallery search
+    user_id: Optional[int] = None
+    similarity: float = 0.0
+    matched: bool = False
+
+    @property
+    def box(self) -> List[int]:
+        return [int(v) for v in self.face[:4]]
+
+    @property
+    def score(self) -> float:
+        return float(self.face[-1])
+
+
+class IoUTracker:
+    """Greedy IoU association of per-frame detections to live tracks.
+
+    Detections matched to a track (IoU >= `iou_threshold`, best pairs first) update it in place;
+    unmatched detections start new tracks; a track unmatched for more than `max_misses`
+    consecutive detection rounds is dropped.
+
+    Embedding is driven per track: a visible track is due when it is new, when its detection score
+    rose by `score_gain` over the score of its last embedding (a better view of the face), or after
+    `refresh_seconds`. Each new embedding is folded into the track's running mean with weight
+    `smoothing`, so one blurred or turned-away frame does not flip the identity.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2, refresh_seconds: float = 2.0,
+                 score_gain: float = 0.05, smoothing: float = 0.5):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.refresh_seconds = refresh_seconds
+        self.score_gain = score_gain
+        self.smoothing = min(1.0, max(0.0, smoothing))
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def update(self, faces: np.ndarray) -> Tuple[List[Track], List[Track]]:
+        """Associates (N, 15) detections with the live tracks; returns (live tracks, newly created tracks)."""
+        faces = np.asarray(faces, dtype=np.float32).reshape(-1, 15)
+        matched_tracks, matched_faces = set(), set()
+        if self.tracks and len(faces):
+            ious = iou_matrix(np.stack([t.face[:4] for t in self.tracks]), faces[:, :4])
+            for flat in np.argsort(-ious, axis=None):
+                t, f = np.unravel_index(flat, ious.shape)
+                if ious[t, f] < self.iou_threshold:
+                    break
+                if t in matched_tracks or f in matched_faces:
+                    continue
+                matched_tracks.add(t)
+                matched_faces.add(f)
+                track = self.tracks[t]
+                track.face = faces[f].copy()
+                track.hits += 1
+                track.misses = 0
+
+        survivors = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+
+        created = []
+        for f in range(len(faces)):
+            if f not in matched_faces:
+                created.append(Track(self._next_id, faces[f].copy()))
+                self._next_id += 1
+        self.tracks = survivors + created
+        return self.tracks, created
+
+    def due_for_embedding(self, now: Optional[float] = None) -> List[Track]:
+        """Visible tracks whose embedding is missing, stale, or taken from a noticeably worse detection."""
+        now = time.monotonic() if now is None else now
+        return [
+            t for t in self.tracks
+            if t.misses == 0 and (
+                t.embedding is None
+                or t.score >= t.embedded_score + self.score_gain
+                or now - t.embedded_at >= self.refresh_seconds
+            )
+        ]
+
+    def observe(self, track: Track, embedding: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+        """Folds a fresh embedding of `track` into its running mean; returns the smoothed embedding."""
+        embedding = l2_normalize(np.asarray(embedding, dtype=np.float32).reshape(-1))
+        if track.embedding is not None:
+            embedding = l2_normalize((1.0 - self.smoothing) * track.embedding + self.smoothing * embedding)
+        track.embedding = embedding
+        track.embedded_at = time.monotonic() if now is None else now
+        track.embedded_score = track.score
+        track.embeddings += 1
+        return embedding
@@ -1,20 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from loguru import logger
 
 from app.core.config import settings
 from app.core.logger import setup_logging
+from app.core.metrics import ServerTimingMiddleware, stage
 from pathlib import Path
 from app.services.ai_service import ai_service
+from app.services.batch_scheduler import inference_batcher
+from app.services.compute_pool import compute_pool, ComputePoolBusy
+from app.utils.preprocessing import detector_pool
+from app.services.embedding_cache import embedding_cache
+from app.services.gallery_service import gallery_service
+from app.services.prediction_log_writer import prediction_log_writer
 
 from app.db.session import engine
 from app.db.base import Base
-from app.db.models import User, PredictionLog, Admin
+from app.db.models import User, PredictionLog, Admin, GalleryChange
 from app.db.init_admin import create_initial_admin
 
 from app.api.api import api_router
-from app.api.endpoints import auth
+from app.api.endpoints import auth, metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -32,15 +40,26 @@ async def lifespan(app: FastAPI):
     from app.db.session import AsyncSessionLocal
     async with AsyncSessionLocal() as db:
         await create_initial_admin(db)
+        with stage("gallery_load"):
+            await gallery_service.load(db)
 
     try:
         ai_service.load_model()
     except Exception as e:
         logger.critical(f"Critical: model load failed. {e}")
 
+    await inference_batcher.start()
+    await prediction_log_writer.start()
+    await gallery_service.start_sync()
+
     yield
 
     logger.info("Server shutdown in progress")
+    await gallery_service.stop_sync()
+    await inference_batcher.stop()
+    await prediction_log_writer.stop()
+    compute_pool.shutdown()
+    gallery_service.save()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -56,11 +75,24 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Added last, so it wraps CORS and times preflight responses too
+app.add_middleware(ServerTimingMiddleware)
+
+@app.exception_handler(ComputePoolBusy)
+async def compute_pool_busy_handler(request: Request, exc: ComputePoolBusy):
+    logger.warning(f"Compute pool saturated; rejecting {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy. Please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
+app.include_router(metrics.router)
 
 
 
@@ -76,7 +108,14 @@ def health_check():
     response = {
         "status": "healthy" if is_loaded else "degraded",
         "model_loaded": is_loaded,
-        "device": str(session.get_providers()) if session else "None"
+        "device": str(session.get_providers()) if session else "None",
+        "model": ai_service.stats(),
+        "inference_batching": inference_batcher.stats(),
+        "compute_pool": compute_pool.stats(),
+        "detector_pool": detector_pool.stats(),
+        "gallery": gallery_service.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "prediction_log": prediction_log_writer.stats()
     }
 
     if not is_loaded:
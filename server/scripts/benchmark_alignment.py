@@ -0,0 +1,128 @@
+"""
+얼굴 정렬(landmark similarity transform) vs 박스 크롭+리사이즈 전처리 비교 벤치마크.
+LFW 폴더 구조(<dataset>/<인물>/<이미지>.jpg, copy_lfw_selected.py 결과물)에서 동일인/타인 쌍을 만들어
+전처리 처리량(ms/face)과 검증 정확도(최적 임계값, FACE_MATCH_THRESHOLD 기준)를 출력합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_alignment.py --dataset ./lfw_selected
+    python scripts/benchmark_alignment.py --dataset ./lfw_selected --pairs 1000 --seed 0
+
+MODEL_PATH, DETECTION_MODEL_PATH 는 .env (app.core.config) 에서 읽습니다.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.ai_service import ai_service
+from app.utils.preprocessing import align_face, crop_face, detect_faces, _resize_and_normalize
+from app.utils.recognition import l2_normalize
+
+TARGET_SIZE = (112, 112)
+
+
+def crop_resize(image: np.ndarray, face: np.ndarray) -> np.ndarray:
+    return cv2.resize(crop_face(image, face), TARGET_SIZE)
+
+
+def align(image: np.ndarray, face: np.ndarray) -> np.ndarray:
+    aligned = align_face(image, face, TARGET_SIZE)
+    return aligned if aligned is not None else crop_resize(image, face)
+
+
+METHODS = {"crop_resize": crop_resize, "align": align}
+
+
+def build_pairs(dataset: Path, n_pairs: int, rng: random.Random):
+    people = {}
+    for person_dir in sorted(p for p in dataset.iterdir() if p.is_dir()):
+        images = sorted(person_dir.glob("*.jpg"))
+        if images:
+            people[person_dir.name] = images
+    multi = [name for name, imgs in people.items() if len(imgs) >= 2]
+    if len(multi) < 1 or len(people) < 2:
+        raise SystemExit("동일인 쌍을 만들 수 있는 인물(이미지 2장 이상)이 부족합니다.")
+
+    pairs = []
+    for _ in range(n_pairs // 2):
+        name = rng.choice(multi)
+        a, b = rng.sample(people[name], 2)
+        pairs.append((a, b, True))
+    names = list(people)
+    for _ in range(n_pairs - n_pairs // 2):
+        n1, n2 = rng.sample(names, 2)
+        pairs.append((rng.choice(people[n1]), rng.choice(people[n2]), False))
+    return pairs
+
+
+def verification_accuracy(similarities: np.ndarray, labels: np.ndarray):
+    """Best-threshold accuracy over all pairs, plus accuracy at FACE_MATCH_THRESHOLD."""
+    best_acc, best_thr = 0.0, 0.0
+    for thr in np.unique(similarities):
+        acc = float(np.mean((similarities >= thr) == labels))
+        if acc > best_acc:
+            best_acc, best_thr = acc, float(thr)
+    at_setting = float(np.mean((similarities >= settings.FACE_MATCH_THRESHOLD) == labels))
+    return best_acc, best_thr, at_setting
+
+
+def main():
+    parser = argparse.ArgumentParser(description="정렬 vs 크롭+리사이즈 전처리 벤치마크 (LFW 쌍)")
+    parser.add_argument("--dataset", default="./lfw_selected", help="LFW 인물별 폴더 경로 (기본 ./lfw_selected)")
+    parser.add_argument("--pairs", type=int, default=600, help="평가 쌍 수 (동일인/타인 반반, 기본 600)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pairs = build_pairs(Path(args.dataset), args.pairs, random.Random(args.seed))
+    paths = sorted({p for a, b, _ in pairs for p in (a, b)})
+    print(f"--- 쌍 {len(pairs)}개, 이미지 {len(paths)}장 ---")
+
+    ai_service.load_model()
+
+    detections = {}
+    for path in paths:
+        image = cv2.imread(str(path))
+        faces = detect_faces(image) if image is not None else None
+        if faces is not None and len(faces) > 0:
+            detections[path] = (image, faces[0])
+    print(f"얼굴 검출 성공: {len(detections)}/{len(paths)}장 (검출 실패 이미지가 포함된 쌍은 제외)")
+
+    usable = [(a, b, same) for a, b, same in pairs if a in detections and b in detections]
+    labels = np.array([same for _, _, same in usable])
+
+    print(f"\n{'method':<12} {'ms/face':>8} {'faces/s':>9} {'best acc':>9} {'thr':>6} {'acc@cfg':>8}")
+    for method_name, method in METHODS.items():
+        start = time.perf_counter()
+        tensors = {}
+        for path, (image, face) in detections.items():
+            face_img = method(image, face)
+            tensors[path] = _resize_and_normalize(face_img, TARGET_SIZE, pre_resized=face_img)
+        elapsed = time.perf_counter() - start
+        ms_per_face = elapsed * 1000 / max(1, len(tensors))
+
+        keys = list(tensors)
+        embeddings = l2_normalize(np.concatenate([
+            ai_service.inference_batch(np.concatenate([tensors[k] for k in keys[i:i + 64]], axis=0))
+            for i in range(0, len(keys), 64)
+        ]))
+        row_of = {k: i for i, k in enumerate(keys)}
+        sims = np.array([float(embeddings[row_of[a]] @ embeddings[row_of[b]]) for a, b, _ in usable])
+        best_acc, best_thr, at_cfg = verification_accuracy(sims, labels)
+
+        print(
+            f"{method_name:<12} {ms_per_face:>8.3f} {1000 / ms_per_face:>9.0f} "
+            f"{best_acc:>9.4f} {best_thr:>6.3f} {at_cfg:>8.4f}"
+        )
+    print(f"\n(acc@cfg: FACE_MATCH_THRESHOLD={settings.FACE_MATCH_THRESHOLD} 기준 정확도, 검출 시간 제외)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+YuNet 검출기 풀(버킷 입력 크기 + 레터박스) vs 단일 전역 검출기(락 + 요청마다 setInputSize) 처리량 비교 벤치마크.
+여러 해상도의 이미지를 스레드 풀에서 동시에 검출하며 동시성 수준별 images/s 를 출력합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_detector_pool.py --dataset ./lfw_selected
+    python scripts/benchmark_detector_pool.py --dataset ./lfw_selected --concurrency 1 2 4 8 --images 400
+
+DETECTION_MODEL_PATH, DETECTION_INPUT_BUCKETS 는 .env (app.core.config) 에서 읽습니다.
+--dataset 을 생략하면 무작위 해상도의 합성 이미지를 사용합니다.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.utils.preprocessing import DetectorPool
+
+SIZES = [(250, 250), (480, 360), (640, 480), (1280, 720), (1920, 1080)]
+
+
+def load_images(dataset: str, n_images: int, rng: random.Random):
+    images = []
+    if dataset:
+        paths = sorted(Path(dataset).rglob("*.jpg"))
+        rng.shuffle(paths)
+        for path in paths[:n_images]:
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            # Mix resolutions so per-request input-size changes actually happen
+            w, h = rng.choice(SIZES)
+            images.append(cv2.resize(image, (w, h)))
+    else:
+        np_rng = np.random.default_rng(rng.randrange(1 << 30))
+        for _ in range(n_images):
+            w, h = rng.choice(SIZES)
+            images.append(np_rng.integers(0, 255, (h, w, 3), dtype=np.uint8))
+    if not images:
+        raise SystemExit("벤치마크할 이미지가 없습니다.")
+    return images
+
+
+def downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    if max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    return cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+class LegacyDetector:
+    """The previous scheme: one shared detector, reconfigured per image under a lock."""
+
+    def __init__(self, max_side: int):
+        self.max_side = max_side
+        self.lock = threading.Lock()
+        self.detector = cv2.FaceDetectorYN.create(
+            model=settings.DETECTION_MODEL_PATH,
+            config="",
+            input_size=(320, 320),
+            score_threshold=settings.DETECTION_SCORE_THRESHOLD,
+            nms_threshold=settings.DETECTION_NMS_THRESHOLD,
+            top_k=5000
+        )
+
+    def detect(self, image: np.ndarray):
+        image = downscale(image, self.max_side)
+        h, w = image.shape[:2]
+        with self.lock:
+            self.detector.setInputSize((w, h))
+            return self.detector.detect(image)[1]
+
+
+class PooledDetector:
+    def __init__(self, max_side: int, workers: int):
+        self.max_side = max_side
+        self.pool = DetectorPool(settings.DETECTION_INPUT_BUCKETS, workers)
+
+    def detect(self, image: np.ndarray):
+        image = downscale(image, min(self.max_side, self.pool.max_side))
+        h, w = image.shape[:2]
+        bucket = self.pool.bucket_for(w, h)
+        padded = cv2.copyMakeBorder(image, 0, bucket - h, 0, bucket - w, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        with self.pool.acquire(bucket) as detector:
+            if detector is None:
+                raise SystemExit(f"YuNet 모델을 불러올 수 없습니다: {settings.DETECTION_MODEL_PATH}")
+            return detector.detect(padded)[1]
+
+
+def run(detector, images, concurrency: int) -> float:
+    # Warm up every bucket/worker so model creation is not timed
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(detector.detect, images[: concurrency * len(SIZES)]))
+        start = time.perf_counter()
+        list(executor.map(detector.detect, images))
+        elapsed = time.perf_counter() - start
+    return len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YuNet 검출기 풀 vs 단일 검출기 동시 처리량 벤치마크")
+    parser.add_argument("--dataset", default=None, help="jpg 이미지 폴더 (생략 시 합성 이미지)")
+    parser.add_argument("--images", type=int, default=300, help="측정 이미지 수 (기본 300)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="동시 스레드 수 목록")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    images = load_images(args.dataset, args.images, random.Random(args.seed))
+    max_side = settings.DETECTION_MAX_SIDE or max(settings.DETECTION_INPUT_BUCKETS)
+    print(f"--- 이미지 {len(images)}장, 검출 최대 변 {max_side}, 버킷 {sorted(settings.DETECTION_INPUT_BUCKETS)} ---")
+
+    print(f"\n{'threads':>7} {'legacy img/s':>13} {'pool img/s':>11} {'speedup':>8}")
+    for concurrency in args.concurrency:
+        legacy = run(LegacyDetector(max_side), images, concurrency)
+        pooled = run(PooledDetector(max_side, concurrency), images, concurrency)
+        print(f"{concurrency:>7} {legacy:>13.1f} {pooled:>11.1f} {pooled / legacy:>7.2f}x")
+    print("\n(cv2.setNumThreads(1): 스레드 간 병렬성만 비교)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+PQ(product quantization) 압축 갤러리 벤치마크: 인물당 메모리와 recall@k / 지연시간을 exact 코사인 경로와 비교.
+benchmark_search_backend.py 와 같은 합성 갤러리를 사용하며, ADC 점수만 쓴 경우와 float 재순위(re-rank) 깊이별 결과를 출력합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_pq.py
+    python scripts/benchmark_pq.py --size 500000 --m 32 64 --rerank 0 50 100 200
+    python scripts/benchmark_pq.py --in-memory   # 재순위용 float 벡터를 RAM 에 (기본: 임시 디렉터리 memmap)
+
+메모리는 두 가지로 나눠 출력합니다: anon = 익명 메모리(코드 + id, --in-memory 면 float 벡터 포함),
+mapped = 파일에 매핑된 재순위 벡터(커널이 필요한 페이지만 올리고 메모리가 부족하면 내려놓음).
+Linux 에서는 빌드 전후 RssAnon 증가량(실측)도 함께 출력합니다.
+"""
+import argparse
+import ctypes
+import gc
+import sys
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from app.utils.recognition import EmbeddingIndex, PQIndex, cosine_similarity, encode_embedding
+from benchmark_search_backend import make_gallery, recall_at_k, time_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PQ 압축 갤러리 메모리 / recall / 지연시간 벤치마크")
+    parser.add_argument("--size", type=int, default=100_000, help="갤러리 크기 (기본 100000)")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, nargs="+", default=[32, 64], help="서브 양자화기 수 = 인물당 코드 바이트")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 50, 100, 200], help="float 재순위 후보 수 (0: ADC만)")
+    parser.add_argument("--noise", type=float, default=1.0)
+    parser.add_argument("--vectors-path", default=None, help="재순위 벡터 memmap 파일 경로 접두사 (생략 시 임시 디렉터리)")
+    parser.add_argument("--in-memory", action="store_true", help="재순위 벡터를 memmap 대신 RAM 에 둠")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    gallery, queries = make_gallery(args.size, args.dim, args.queries, args.noise, args.seed)
+    ids = np.arange(1, args.size + 1)
+    print(f"--- 갤러리 {args.size:,} x {args.dim}, 쿼리 {args.queries}, k={args.k} ---")
+
+    exact = EmbeddingIndex()
+    exact.build(ids, gallery)
+    truth, exact_ms = time_queries(exact, queries, args.k)
+
+    blob_bytes = len(encode_embedding(gallery[0]))
+    exact_bytes = exact.matrix[0].nbytes + 8
+    exact_p50 = np.percentile(exact_ms, 50)
+    print(f"\n인물당 메모리: exact 행렬 {exact_bytes} B (float32 + id), DB float32 blob {blob_bytes} B")
+    print(f"{'backend':<16} {'anon B/id':>10} {'mapped B/id':>12} {'RssAnon B/id':>13} {'recall@k':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'top1 |Δcos|':>12}")
+    print(f"{'exact':<16} {exact_bytes:>10} {0:>12} {'-':>13} {1.0:>9.4f} {exact_p50:>8.3f} "
+          f"{np.percentile(exact_ms, 99):>8.3f} {0.0:>12.5f}")
+
+    for m in args.m:
+        gc.collect()
+        rss_before = rss_anon_bytes()
+        start = time.perf_counter()
+        pq = PQIndex(m=m, vectors_path=args.vectors_path, min_train_size=0, in_memory=args.in_memory)
+        pq.build(ids, gallery)
+        train_s = time.perf_counter() - start
+        gc.collect()
+        rss_after = rss_anon_bytes()
+        memory = pq.memory_bytes()
+        anon = (memory["codes"] + memory["ids"] + memory["vectors"]) / len(pq)
+        mapped = memory["vectors_mapped"] / len(pq)
+        measured = f"{(rss_after - rss_before) / len(pq):.1f}" if rss_before is not None else "n/a"
+
+        for rerank in args.rerank:
+            pq.rerank = rerank
+            found, pq_ms = time_queries(pq, queries, args.k)
+            # Score error of the reported top-1 against the reference cosine_similarity path
+            errors = []
+            for q in queries[:50]:
+                top_ids, top_scores = pq.search(q, 1)
+                errors.append(abs(float(top_scores[0]) - cosine_similarity(q, gallery[top_ids[0] - 1])))
+            p50 = np.percentile(pq_ms, 50)
+            label = f"pq{m}/rr{rerank}"
+            print(f"{label:<16} {anon:>10.1f} {mapped:>12.1f} {measured:>13} {recall_at_k(truth, found):>9.4f} "
+                  f"{p50:>8.3f} {np.percentile(pq_ms, 99):>8.3f} {max(errors):>12.5f}"
+                  f"  ({'exact 보다 ' + ('빠름' if p50 < exact_p50 else '느림')} x{exact_p50 / p50:.2f})")
+        print(f"  (pq{m}: 학습 {train_s:.1f}s, 코드북 {memory['codebooks'] / 1024:.0f} KiB 공유, "
+              f"재순위 벡터 {'RAM' if args.in_memory else 'memmap'})")
+        del pq
+
+
+def rss_anon_bytes():
+    """RssAnon of this process from /proc (Linux only); None elsewhere. Free heap is returned to the OS
+    first (glibc malloc_trim) so training temporaries the allocator kept do not count as index memory."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+if __name__ == "__main__":
+    main()
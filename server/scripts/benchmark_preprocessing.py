@@ -0,0 +1,112 @@
+"""
+정렬된 얼굴 크롭 -> 모델 입력 변환 비용 마이크로 벤치마크 (얼굴당 µs).
+  legacy : 이전 _resize_and_normalize (cvtColor, astype, 빼기, 나누기, transpose, expand_dims) + _run 의 astype 복사
+  blob   : 현재 float 경로 (cv2.dnn.blobFromImage 한 번으로 채널 변환·정규화·NCHW)
+  fused  : fuse_preprocessing.py 모델용 uint8 NHWC 배치 (크롭을 그대로 쌓기만 함)
+--model / --fused-model 을 주면 두 모델의 session.run 시간까지 더한 얼굴당 총 비용도 출력합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_preprocessing.py
+    python scripts/benchmark_preprocessing.py --dataset ./lfw_selected --batch 32
+    python scripts/benchmark_preprocessing.py --model models/face.onnx --fused-model models/face_fused.onnx
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+TARGET_SIZE = (112, 112)
+
+
+def legacy(faces):
+    tensors = []
+    for face in faces:
+        rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
+        normalized = (rgb.astype(np.float32) - 127.5) / 128.0
+        tensors.append(np.expand_dims(np.transpose(normalized, (2, 0, 1)), axis=0))
+    return np.concatenate(tensors, axis=0).astype(np.float32)
+
+
+def blob(faces):
+    return np.concatenate([
+        cv2.dnn.blobFromImage(face, scalefactor=1.0 / 128.0, mean=(127.5, 127.5, 127.5), swapRB=True)
+        for face in faces
+    ], axis=0)
+
+
+def fused(faces):
+    return np.ascontiguousarray(np.stack(faces))
+
+
+METHODS = {"legacy": legacy, "blob": blob, "fused": fused}
+
+
+def load_faces(dataset: str, count: int, rng: np.random.Generator):
+    faces = []
+    if dataset:
+        for path in sorted(Path(dataset).rglob("*.jpg"))[:count]:
+            image = cv2.imread(str(path))
+            if image is not None:
+                faces.append(cv2.resize(image, TARGET_SIZE))
+    while len(faces) < count:
+        faces.append(rng.integers(0, 256, TARGET_SIZE[::-1] + (3,), dtype=np.uint8))
+    return faces
+
+
+def time_per_face(fn, batches, repeats: int) -> float:
+    fn(batches[0])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for batch in batches:
+            fn(batch)
+    faces = repeats * sum(len(b) for b in batches)
+    return (time.perf_counter() - start) * 1e6 / faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="얼굴 크롭 -> 모델 입력 변환 비용 (legacy / blob / fused)")
+    parser.add_argument("--dataset", default=None, help="jpg 이미지 폴더 (생략 시 합성 크롭)")
+    parser.add_argument("--faces", type=int, default=256)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--model", default=None, help="float NCHW 모델 (session.run 포함 측정)")
+    parser.add_argument("--fused-model", default=None, help="fuse_preprocessing.py 결과 모델")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    faces = load_faces(args.dataset, args.faces, np.random.default_rng(0))
+    print(f"--- 얼굴 {len(faces)}개 ({TARGET_SIZE[0]}x{TARGET_SIZE[1]}), 반복 {args.repeats} ---")
+
+    sessions = {}
+    if args.model and args.fused_model:
+        for name, path in (("float", args.model), ("fused", args.fused_model)):
+            session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            sessions[name] = (session, session.get_inputs()[0].name)
+
+    header = f"{'batch':>5} " + " ".join(f"{name + ' µs':>10}" for name in METHODS)
+    if sessions:
+        header += f" {'float+run':>10} {'fused+run':>10}"
+    print(header)
+    for batch_size in args.batch:
+        batches = [faces[i:i + batch_size] for i in range(0, len(faces) - batch_size + 1, batch_size)]
+        row = {name: time_per_face(fn, batches, args.repeats) for name, fn in METHODS.items()}
+        line = f"{batch_size:>5} " + " ".join(f"{row[name]:>10.1f}" for name in METHODS)
+        if sessions:
+            float_session, float_input = sessions["float"]
+            fused_session, fused_input = sessions["fused"]
+            float_total = time_per_face(lambda b: float_session.run(None, {float_input: blob(b)}), batches, args.repeats)
+            fused_total = time_per_face(lambda b: fused_session.run(None, {fused_input: fused(b)}), batches, args.repeats)
+            line += f" {float_total:>10.1f} {fused_total:>10.1f}"
+        print(line)
+    print("\n(µs/face, cv2.setNumThreads(1); fused 열은 정규화를 모델 그래프가 수행하므로 변환 비용만 표시)")
+
+
+if __name__ == "__main__":
+    main()
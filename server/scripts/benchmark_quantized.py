@@ -0,0 +1,150 @@
+"""
+float 임베딩 모델 vs INT8 양자화 모델(quantize_int8.py 결과) 비교 리포트.
+embeddings/s(배치 크기별), 단건 지연시간 p50/p99, LFW 쌍 검증 정확도, 두 모델 임베딩 간 코사인 일치도를 출력합니다.
+노드(CPU)마다 실행해 어느 모델을 서빙할지(MODEL_PRECISION) 결정하는 용도입니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_quantized.py --dataset ./lfw_selected
+    python scripts/benchmark_quantized.py --dataset ./lfw_selected --batch-sizes 1 8 32 --threads 4 --json report.json
+
+MODEL_PATH, INT8_MODEL_PATH, DETECTION_MODEL_PATH 는 .env (app.core.config) 에서 읽습니다.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from app.core.config import settings
+from app.services.ai_service import int8_model_path
+from app.utils.preprocessing import pre_process
+from app.utils.recognition import l2_normalize
+from benchmark_alignment import build_pairs, verification_accuracy
+
+
+class Model:
+    def __init__(self, path: str, threads: int):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim = model_input.shape[0]
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def embed_all(self, tensors: np.ndarray) -> np.ndarray:
+        size = self.fixed_batch or 64
+        out = []
+        for start in range(0, len(tensors), size):
+            chunk = tensors[start:start + size]
+            valid = len(chunk)
+            if self.fixed_batch and valid < size:
+                chunk = np.concatenate([chunk, np.zeros((size - valid,) + chunk.shape[1:], np.float32)])
+            out.append(self.run(chunk)[:valid])
+        return l2_normalize(np.concatenate(out))
+
+
+def latency_ms(model: Model, tensors: np.ndarray, runs: int, rng: np.random.Generator) -> np.ndarray:
+    batch = model.fixed_batch or 1
+    samples = []
+    for _ in range(runs):
+        rows = rng.integers(0, len(tensors), batch)
+        start = time.perf_counter()
+        model.run(tensors[rows])
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.array(samples)
+
+
+def throughput(model: Model, tensors: np.ndarray, batch_size: int, seconds: float) -> float:
+    batch = np.resize(tensors, (batch_size,) + tensors.shape[1:])
+    model.run(batch)  # warm-up for this shape
+    done, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        model.run(batch)
+        done += batch_size
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="float vs INT8 임베딩 모델 처리량 / 지연시간 / 정확도 비교")
+    parser.add_argument("--dataset", default="./lfw_selected", help="LFW 인물별 폴더 경로 (기본 ./lfw_selected)")
+    parser.add_argument("--float", dest="float_model", default=settings.MODEL_PATH)
+    parser.add_argument("--int8", dest="int8_model", default=None, help="기본 INT8_MODEL_PATH 또는 <모델>.int8.onnx")
+    parser.add_argument("--pairs", type=int, default=600, help="검증 쌍 수 (동일인/타인 반반, 기본 600)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--runs", type=int, default=300, help="지연시간 측정 횟수 (기본 300)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="배치 크기별 처리량 측정 시간 (기본 3초)")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op 스레드 수 (0: ORT 기본값)")
+    parser.add_argument("--json", default=None, help="결과를 JSON 으로도 저장할 경로")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models = {"float32": args.float_model, "int8": args.int8_model or int8_model_path()}
+    for name, path in models.items():
+        if not Path(path).is_file():
+            raise SystemExit(f"{name} 모델이 없습니다: {path}")
+
+    pairs = build_pairs(Path(args.dataset), args.pairs, random.Random(args.seed))
+    paths = sorted({p for a, b, _ in pairs for p in (a, b)})
+    images = {p: cv2.imread(str(p)) for p in paths}
+    paths = [p for p in paths if images[p] is not None]
+    tensors = np.concatenate([pre_process(images[p]) for p in paths])
+    row_of = {p: i for i, p in enumerate(paths)}
+    usable = [(a, b, same) for a, b, same in pairs if a in row_of and b in row_of]
+    labels = np.array([same for _, _, same in usable])
+    print(f"--- 쌍 {len(usable)}개, 이미지 {len(paths)}장, threads={args.threads or 'default'} ---")
+
+    report, embeddings = {}, {}
+    for name, path in models.items():
+        model = Model(path, args.threads)
+        embeddings[name] = model.embed_all(tensors)
+        sims = np.einsum("ij,ij->i", embeddings[name][[row_of[a] for a, _, _ in usable]],
+                         embeddings[name][[row_of[b] for _, b, _ in usable]])
+        best_acc, best_thr, at_cfg = verification_accuracy(sims, labels)
+        lat = latency_ms(model, tensors, args.runs, np.random.default_rng(args.seed))
+        sizes = [model.fixed_batch] if model.fixed_batch else args.batch_sizes
+        report[name] = {
+            "path": path,
+            "size_mib": round(Path(path).stat().st_size / 2**20, 2),
+            "embeddings_per_s": {b: round(throughput(model, tensors, b, args.seconds), 1) for b in sizes},
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+            "best_acc": round(best_acc, 4),
+            "best_thr": round(best_thr, 3),
+            "acc_at_cfg": round(at_cfg, 4),
+        }
+
+    agreement = np.einsum("ij,ij->i", embeddings["float32"], embeddings["int8"])
+    report["agreement"] = {
+        "mean_cosine": round(float(agreement.mean()), 5),
+        "min_cosine": round(float(agreement.min()), 5),
+    }
+
+    print(f"\n{'model':<8} {'MiB':>7} {'p50 ms':>8} {'p99 ms':>8} {'best acc':>9} {'thr':>6} {'acc@cfg':>8}  embeddings/s (batch)")
+    for name in models:
+        r = report[name]
+        rates = "  ".join(f"{rate:.0f} (b{b})" for b, rate in r["embeddings_per_s"].items())
+        print(f"{name:<8} {r['size_mib']:>7.1f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['best_acc']:>9.4f} {r['best_thr']:>6.3f} {r['acc_at_cfg']:>8.4f}  {rates}")
+    print(f"\nfloat32 vs int8 임베딩 코사인: 평균 {report['agreement']['mean_cosine']:.5f}, "
+          f"최소 {report['agreement']['min_cosine']:.5f}")
+    print(f"(acc@cfg: FACE_MATCH_THRESHOLD={settings.FACE_MATCH_THRESHOLD} 기준; p50/p99 는 단건 session.run)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"JSON 저장: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+갤러리 검색 백엔드 벤치마크: IVF(근사) vs exact 전수 스캔의 recall@k 와 쿼리 지연시간 비교.
+클러스터 구조를 가진 합성 임베딩(인물별 중심 + 노이즈)으로 갤러리를 만들고, 같은 인물의 다른 샘플을 쿼리로 사용합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/benchmark_search_backend.py
+    python scripts/benchmark_search_backend.py --size 1000000 --nlist 4096 --nprobe 8 16 32 64
+    python scripts/benchmark_search_backend.py --save ./gallery_ivf.npz   # 학습된 인덱스 저장 (SEARCH_INDEX_PATH 로 재사용)
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from app.utils.recognition import EmbeddingIndex, IVFIndex, l2_normalize, load_search_backend
+
+
+def make_gallery(size: int, dim: int, n_queries: int, noise: float, seed: int):
+    rng = np.random.default_rng(seed)
+    n_centers = max(1, size // 50)
+    noise = noise / np.sqrt(dim)  # per-dimension std so the noise vector has norm ~= noise
+    centers = l2_normalize(rng.standard_normal((n_centers, dim), dtype=np.float32))
+    gallery = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 100_000):
+        end = min(size, start + 100_000)
+        owners = rng.integers(0, n_centers, end - start)
+        gallery[start:end] = l2_normalize(centers[owners] + noise * rng.standard_normal((end - start, dim), dtype=np.float32))
+    picked = rng.choice(size, n_queries, replace=False)
+    queries = l2_normalize(gallery[picked] + noise * 0.5 * rng.standard_normal((n_queries, dim), dtype=np.float32))
+    return gallery, queries
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(q, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(np.pad(ids, (0, k - len(ids)), constant_values=-1))
+    return np.array(found), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF vs exact 검색 백엔드 recall@k / 지연시간 벤치마크")
+    parser.add_argument("--size", type=int, default=200_000, help="갤러리 크기 (기본 200000)")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--noise", type=float, default=1.0, help="인물 중심(단위 벡터) 대비 샘플 노이즈 벡터의 크기")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", default=None, help="학습된 IVF 인덱스 저장 경로 (.npz)")
+    args = parser.parse_args()
+
+    gallery, queries = make_gallery(args.size, args.dim, args.queries, args.noise, args.seed)
+    ids = np.arange(1, args.size + 1)
+    print(f"--- 갤러리 {args.size:,} x {args.dim}, 쿼리 {args.queries}, k={args.k}, nlist={args.nlist} ---")
+
+    exact = EmbeddingIndex()
+    exact.build(ids, gallery)
+    truth, exact_ms = time_queries(exact, queries, args.k)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(nlist=args.nlist, nprobe=args.nprobe[0])
+    ivf.build(ids, gallery)
+    build_s = time.perf_counter() - start
+    print(f"IVF 학습+할당: {build_s:.1f}s (trained={ivf.is_trained})")
+
+    print(f"\n{'backend':<14} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    print(f"{'exact':<14} {1.0:>9.4f} {np.percentile(exact_ms, 50):>8.3f} "
+          f"{np.percentile(exact_ms, 99):>8.3f} {1000 / exact_ms.mean():>8.0f}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ivf_ms = time_queries(ivf, queries, args.k)
+        print(f"{f'ivf/{nprobe}':<14} {recall_at_k(truth, found):>9.4f} {np.percentile(ivf_ms, 50):>8.3f} "
+              f"{np.percentile(ivf_ms, 99):>8.3f} {1000 / ivf_ms.mean():>8.0f}")
+
+    # Incremental maintenance cost on the trained index
+    start = time.perf_counter()
+    for item_id, vector in zip(ids[:1000], gallery[:1000]):
+        ivf.remove(int(item_id))
+        ivf.add(int(item_id), vector)
+    print(f"\nremove+add: {(time.perf_counter() - start) * 1000 / 1000:.3f} ms/건")
+
+    if args.save:
+        start = time.perf_counter()
+        ivf.save(args.save)
+        saved_s = time.perf_counter() - start
+        start = time.perf_counter()
+        restored = load_search_backend(args.save)
+        print(f"저장 {saved_s:.2f}s / 복원 {time.perf_counter() - start:.2f}s ({len(restored):,}건) -> {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+users.face_embedding 을 JSON 텍스트에서 바이너리(blob)로 변환하는 마이그레이션 스크립트.
+이미 바이너리인 행은 --dtype 이 다를 때만 재인코딩합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/convert_face_embedding_to_binary.py
+    python scripts/convert_face_embedding_to_binary.py --dtype float16 --batch-size 1000
+    python scripts/convert_face_embedding_to_binary.py --dry-run
+
+DATABASE_URL, EMBEDDING_STORAGE_DTYPE 은 .env (app.core.config) 에서 읽습니다.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.utils.recognition import decode_embedding, encode_embedding
+
+
+async def convert(dtype: str, batch_size: int, dry_run: bool) -> None:
+    engine = create_async_engine(settings.DATABASE_URL)
+    converted = 0
+    skipped = 0
+    failed = 0
+    last_id = 0
+
+    async with engine.connect() as conn:
+        while True:
+            rows = (
+                await conn.execute(
+                    text(
+                        "SELECT id, face_embedding FROM users WHERE id > :last_id ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": batch_size},
+                )
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                raw = row.face_embedding
+                try:
+                    blob = encode_embedding(decode_embedding(raw), dtype)
+                    if isinstance(raw, (bytes, memoryview)) and bytes(raw) == blob:
+                        skipped += 1
+                        continue
+                    updates.append({"id": row.id, "blob": blob})
+                except Exception as e:
+                    print(f"  [실패] id={row.id} - {e}")
+                    failed += 1
+
+            if updates and not dry_run:
+                await conn.execute(
+                    text("UPDATE users SET face_embedding = :blob WHERE id = :id"), updates
+                )
+                await conn.commit()
+            converted += len(updates)
+            print(f"  ... id <= {last_id} 처리 (변환 누적 {converted})")
+
+    await engine.dispose()
+    mode = " (dry-run, 저장 안 함)" if dry_run else ""
+    print(f"\n완료{mode}: 변환 {converted} / 건너뜀 {skipped} / 실패 {failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="users.face_embedding JSON → 바이너리 변환")
+    parser.add_argument(
+        "--dtype",
+        default=settings.EMBEDDING_STORAGE_DTYPE,
+        choices=["float32", "float16", "int8"],
+        help="저장 dtype (기본: env EMBEDDING_STORAGE_DTYPE)",
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="커밋 단위 행 수 (기본 500)")
+    parser.add_argument("--dry-run", action="store_true", help="변환 대상만 집계하고 저장하지 않음")
+    args = parser.parse_args()
+
+    print(f"--- DB: {settings.DATABASE_URL} / dtype: {args.dtype} ---")
+    asyncio.run(convert(args.dtype, args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
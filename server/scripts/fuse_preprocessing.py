@@ -0,0 +1,121 @@
+"""
+임베딩 ONNX 모델 앞단에 입력 전처리(BGR→RGB, (x - 127.5) / 128, NHWC→NCHW)를 노드로 붙여 저장하는 스크립트.
+결과 모델의 입력은 uint8 [N, H, W, 3] BGR 이며, 서버는 정렬된 112x112 얼굴 크롭을 그대로 쌓아 넘깁니다
+(ModelService 가 uint8 입력을 감지해 _resize_and_normalize 가 float 변환을 생략).
+
+사용법 (server/ 에서 실행):
+    python scripts/fuse_preprocessing.py
+    python scripts/fuse_preprocessing.py --src models/face.onnx --dest models/face_fused.onnx
+
+INT8 모델에 쓰려면 quantize_int8.py 로 먼저 양자화한 뒤 그 결과(<모델>.int8.onnx)에 적용하세요
+(보정 데이터는 float NCHW 입력을 가정합니다). onnx 패키지가 필요합니다 (pip install onnx).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from app.core.config import settings
+
+MEAN = 127.5
+SCALE = 128.0
+
+
+def fuse_preprocessing(src: Path, dest: Path, input_name: str = "input_bgr_uint8") -> None:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    model = onnx.load(str(src))
+    graph = model.graph
+    initializer_names = {init.name for init in graph.initializer}
+    graph_inputs = [value for value in graph.input if value.name not in initializer_names]
+    if len(graph_inputs) != 1:
+        raise ValueError(f"입력이 하나인 모델만 지원합니다: {[v.name for v in graph_inputs]}")
+    original = graph_inputs[0]
+    tensor_type = original.type.tensor_type
+    if tensor_type.elem_type == TensorProto.UINT8:
+        raise ValueError("이미 uint8 입력 모델입니다 (전처리가 합쳐져 있음)")
+
+    dims = tensor_type.shape.dim
+    if len(dims) != 4:
+        raise ValueError(f"NCHW 4차원 입력만 지원합니다: {original.name}")
+    batch, channels, height, width = (d.dim_param or d.dim_value for d in dims)
+    if channels not in (3, "", 0):
+        raise ValueError(f"3채널 입력만 지원합니다 (C={channels})")
+
+    prefix = "fused_preprocess"
+    graph.initializer.extend([
+        numpy_helper.from_array(np.array([2, 1, 0], dtype=np.int64), f"{prefix}/bgr_to_rgb"),
+        numpy_helper.from_array(np.array(MEAN, dtype=np.float32), f"{prefix}/mean"),
+        numpy_helper.from_array(np.array(SCALE, dtype=np.float32), f"{prefix}/scale"),
+    ])
+    # uint8 NHWC BGR -> NCHW -> RGB (plane gather; a Gather on the innermost axis is several times slower)
+    # -> float -> (x - 127.5) / 128. Layout and channel moves stay on the 1-byte tensor.
+    nodes = [
+        helper.make_node("Transpose", [input_name], [f"{prefix}/nchw"], perm=[0, 3, 1, 2]),
+        helper.make_node("Gather", [f"{prefix}/nchw", f"{prefix}/bgr_to_rgb"], [f"{prefix}/rgb"], axis=1),
+        helper.make_node("Cast", [f"{prefix}/rgb"], [f"{prefix}/float"], to=TensorProto.FLOAT),
+        helper.make_node("Sub", [f"{prefix}/float", f"{prefix}/mean"], [f"{prefix}/centered"]),
+        helper.make_node("Div", [f"{prefix}/centered", f"{prefix}/scale"], [original.name]),
+    ]
+    for node in reversed(nodes):
+        graph.node.insert(0, node)
+
+    new_input = helper.make_tensor_value_info(input_name, TensorProto.UINT8, [batch, height, width, 3])
+    graph.input.remove(original)
+    graph.input.insert(0, new_input)
+    onnx.checker.check_model(model)
+    onnx.save(model, str(dest))
+    print(f"  입력 {original.name} [{batch}, {channels}, {height}, {width}] float -> {input_name} "
+          f"[{batch}, {height}, {width}, 3] uint8")
+
+
+def reference_input(face_bgr: np.ndarray) -> np.ndarray:
+    """The float NCHW tensor the original model expects (what _resize_and_normalize used to build)."""
+    rgb = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB)
+    return np.transpose((rgb.astype(np.float32) - MEAN) / SCALE, (2, 0, 1))[None]
+
+
+def verify(src: Path, dest: Path, batch: int = 4) -> None:
+    original = ort.InferenceSession(str(src), providers=["CPUExecutionProvider"])
+    fused = ort.InferenceSession(str(dest), providers=["CPUExecutionProvider"])
+    src_input, fused_input = original.get_inputs()[0], fused.get_inputs()[0]
+    fixed = src_input.shape[0] if isinstance(src_input.shape[0], int) else batch
+    height, width = (d if isinstance(d, int) else 112 for d in src_input.shape[2:])
+
+    rng = np.random.default_rng(0)
+    faces = rng.integers(0, 256, (fixed, height, width, 3), dtype=np.uint8)
+    expected = original.run(None, {src_input.name: np.concatenate([reference_input(f) for f in faces])})[0]
+    actual = fused.run(None, {fused_input.name: faces})[0]
+    max_diff = float(np.abs(expected - actual).max())
+    print(f"검증: 입력 {list(faces.shape)} uint8 -> 출력 {actual.shape}, float 경로 대비 최대 오차 {max_diff:.2e}")
+    if max_diff > 1e-3:
+        raise RuntimeError("합쳐진 전처리 결과가 원본 경로와 다릅니다.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX 모델에 입력 정규화·채널 변환·레이아웃 변환 합치기")
+    parser.add_argument("--src", default=settings.MODEL_PATH, help="원본 모델 경로 (기본: env MODEL_PATH)")
+    parser.add_argument("--dest", default=None, help="저장 경로 (기본: <src>_fused.onnx)")
+    args = parser.parse_args()
+
+    src = Path(args.src)
+    dest = Path(args.dest) if args.dest else src.with_name(f"{src.stem}_fused{src.suffix}")
+
+    try:
+        fuse_preprocessing(src, dest)
+    except ImportError:
+        print("onnx 패키지가 필요합니다: pip install onnx")
+        return
+    verify(src, dest)
+    print(f"\n완료: {dest} (MODEL_PATH 로 지정해 사용)")
+
+
+if __name__ == "__main__":
+    main()
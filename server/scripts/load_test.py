@@ -0,0 +1,443 @@
+"""
+인식 API 종단 간 부하 테스트 / 벤치마크.
+1) /users/register/bulk 로 N명(LFW 인물 폴더 또는 합성 이미지)을 등록하고
+2) /users/search, /face/inference(바이너리 텐서), /users/face-image · face-preprocessed-image 를
+   동시성 수준별로 호출해 처리량(req/s), 지연시간 p50/p95/p99, Server-Timing 헤더의 단계별 시간을 출력합니다.
+결과는 JSON 으로 저장되며, --compare 로 두 버전의 결과를 비교해 회귀를 확인합니다.
+
+사용법 (server/ 에서 실행, httpx 필요: pip install httpx):
+    # 서버 프로세스 없이 앱을 인프로세스로 띄워 임시 SQLite DB 로 측정
+    python scripts/load_test.py --in-process --dataset ./lfw_selected --identities 200 --output results/new.json
+    # 실행 중인 서버 대상 (SUPERUSER_ID / SUPERUSER_PASSWORD 환경 변수 또는 --username / --password 로 로그인)
+    python scripts/load_test.py --base-url http://localhost:8000 --concurrency 1 8 32 --requests 500
+    # 두 결과 비교
+    python scripts/load_test.py --compare results/old.json results/new.json
+
+--in-process 는 DATABASE_URL / FACE_IMAGE_DIR / GALLERY_SNAPSHOT_DIR 를 임시 폴더로 바꾸고
+EMBEDDING_CACHE_ENABLED=false 로 앱을 띄우므로 기존 DB 를 건드리지 않습니다 (나머지 설정은 .env 에서 읽음).
+search 시나리오는 요청마다 쿼리 JPEG 의 EOI 뒤에 고유한 바이트를 붙여 보내므로 원격 서버의 임베딩 캐시도
+적중하지 않고 디코드 · 검출 · 추론이 매번 실행됩니다 (디코드 결과는 동일). 캐시 경로 자체를 재려면 --embedding-cache.
+각 측정의 임베딩 캐시 적중률(/health 의 embedding_cache 변화량)을 결과에 함께 출력합니다. 원격 서버에는 --name-prefix 로 시작하는
+이름으로 등록하며, 이미 등록된 이름은 그대로 재사용합니다.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+API = "/api/v1"
+SCENARIOS = ["search", "inference", "face_image", "face_preprocessed_image"]
+
+
+class Identity:
+    def __init__(self, name: str, register_image: bytes, query_image: bytes):
+        self.name = name
+        self.register_image = register_image
+        self.query_image = query_image
+        self.identity_id: Optional[str] = None
+
+
+def synthetic_image(rng: np.random.Generator) -> bytes:
+    # Blocky noise: distinct per identity, and without a face the server falls back to the whole image
+    small = rng.integers(0, 256, (24, 24, 3), dtype=np.uint8)
+    image = cv2.resize(small, (200, 240), interpolation=cv2.INTER_NEAREST)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def load_identities(dataset: Optional[str], count: int, prefix: str, seed: int) -> List[Identity]:
+    """One identity per LFW person folder (first image registered, second used as the query when present),
+    topped up with synthetic images."""
+    identities = []
+    if dataset:
+        for person in sorted(p for p in Path(dataset).iterdir() if p.is_dir()):
+            if len(identities) >= count:
+                break
+            images = sorted(person.glob("*.jpg"))
+            if not images:
+                continue
+            register = images[0].read_bytes()
+            query = images[1].read_bytes() if len(images) > 1 else register
+            identities.append(Identity(f"{prefix}{person.name}", register, query))
+    rng = np.random.default_rng(seed)
+    while len(identities) < count:
+        image = synthetic_image(rng)
+        identities.append(Identity(f"{prefix}synthetic_{len(identities):05d}", image, image))
+    return identities
+
+
+def percentiles(values_ms: List[float]) -> Dict[str, float]:
+    if not values_ms:
+        return {}
+    values = np.asarray(values_ms)
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def server_stages(response) -> Dict[str, float]:
+    """Per-stage server times (ms) from the Server-Timing header (`name;dur=ms, ...`), falling back to
+    X-Execution-Time-Ms on servers without it."""
+    stages = {}
+    for entry in response.headers.get("server-timing", "").split(","):
+        name, *params = (part.strip() for part in entry.split(";"))
+        for param in params:
+            if name and param.startswith("dur="):
+                stages[name] = stages.get(name, 0.0) + float(param[len("dur="):])
+    execution_time = response.headers.get("x-execution-time-ms")
+    if not stages and execution_time:
+        stages["inference"] = float(execution_time)
+    return stages
+
+
+async def run_load(client, send: Callable, check: Optional[Callable], total: int, concurrency: int) -> dict:
+    """Fires `total` requests from `concurrency` workers; send(client, i) returns the response."""
+    latencies, stage_times, status_counts = [], {}, {}
+    errors = checked = passed = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors, checked, passed
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            try:
+                response = await send(client, i)
+                await response.aread()
+            except Exception as e:
+                errors += 1
+                status_counts[type(e).__name__] = status_counts.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            key = str(response.status_code)
+            status_counts[key] = status_counts.get(key, 0) + 1
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            for stage, ms in server_stages(response).items():
+                stage_times.setdefault(stage, []).append(ms)
+            if check is not None:
+                checked += 1
+                passed += bool(check(response, i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    result = {
+        "requests": total,
+        "errors": errors,
+        "status_counts": status_counts,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round((total - errors) / wall, 2) if wall > 0 else 0.0,
+        "latency": percentiles(latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stage_times.items())},
+    }
+    if checked:
+        result["check_pass_rate"] = round(passed / checked, 4)
+    return result
+
+
+async def cache_counters(client) -> Dict[str, int]:
+    cache = (await client.get("/health")).json().get("embedding_cache", {})
+    return {"hits": cache.get("hits", 0), "misses": cache.get("misses", 0)}
+
+
+def cache_delta(before: Dict[str, int], after: Dict[str, int]) -> dict:
+    """Embedding cache lookups during one measured run (other clients of a shared server count too)."""
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None}
+
+
+async def login(client, username: str, password: str) -> Dict[str, str]:
+    response = await client.post(f"{API}/auth/login", data={"username": username, "password": password})
+    if response.status_code != 200:
+        raise SystemExit(f"로그인 실패 ({response.status_code}): {response.text}")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def seed(client, headers, identities: List[Identity], chunk_size: int) -> dict:
+    """Registers identities through /users/register/bulk (SSE), then resolves their identity_ids."""
+    registered = already = failed = 0
+    start = time.perf_counter()
+    for offset in range(0, len(identities), chunk_size):
+        chunk = identities[offset:offset + chunk_size]
+        files = [("files", (f"{i}.jpg", ident.register_image, "image/jpeg")) for i, ident in enumerate(chunk)]
+        data = {"names": [ident.name for ident in chunk]}
+        response = await client.post(f"{API}/users/register/bulk", files=files, data=data, headers=headers)
+        if response.status_code != 200:
+            raise SystemExit(f"대량 등록 실패 ({response.status_code}): {response.text}")
+        for line in response.text.splitlines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event["type"] != "progress":
+                continue
+            if event["status"] == "success":
+                registered += 1
+            elif event.get("reason") == "Already registered":
+                already += 1
+            else:
+                failed += 1
+    seconds = time.perf_counter() - start
+
+    by_name = {ident.name: ident for ident in identities}
+    skip, page = 0, 1000
+    while True:
+        response = await client.get(f"{API}/users/", params={"skip": skip, "limit": page}, headers=headers)
+        users = response.json()
+        for user in users:
+            if user["name"] in by_name:
+                by_name[user["name"]].identity_id = user["identity_id"]
+        if len(users) < page:
+            break
+        skip += page
+
+    return {
+        "identities": len(identities),
+        "registered": registered,
+        "already_registered": already,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "registrations_per_second": round(registered / seconds, 2) if seconds > 0 else 0.0,
+    }
+
+
+def inference_bodies(model: dict, batch: int, count: int, rng: np.random.Generator):
+    """Random binary tensors laid out the way the served model expects (see /health model.input_format)."""
+    dims = [d if isinstance(d, int) else None for d in (model.get("input_shape") or [])[1:]]
+    if model.get("input_format") == "nhwc_uint8":
+        height, width = dims[0] or 112, dims[1] or 112
+        shape, dtype = (batch, height, width, 3), "uint8"
+        make = lambda: rng.integers(0, 256, shape, dtype=np.uint8)
+    else:
+        height, width = (dims[1] or 112, dims[2] or 112) if len(dims) == 3 else (112, 112)
+        shape, dtype = (batch, 3, height, width), "float32"
+        make = lambda: rng.uniform(-1, 1, shape).astype(np.float32)
+    headers = {
+        "Content-Type": "application/octet-stream",
+        "Accept": "application/octet-stream",
+        "X-Tensor-Shape": ",".join(str(d) for d in shape),
+        "X-Tensor-Dtype": dtype,
+    }
+    return [make().tobytes() for _ in range(count)], headers
+
+
+def unique_query(image: bytes, i: int) -> bytes:
+    """The same JPEG with per-request bytes after its EOI marker: decoders stop at EOI, so the image is
+    identical, but the bytes (and so the embedding cache key) differ on every request."""
+    return image + b"\x00" + i.to_bytes(8, "little")
+
+
+def build_scenarios(identities: List[Identity], auth: Dict[str, str], model: dict, inference_batch: int, seed_value: int,
+                    repeat_queries: bool = False):
+    searchable = [ident for ident in identities if ident.identity_id]
+    if not searchable:
+        raise SystemExit("등록된 인물이 없어 측정할 수 없습니다.")
+    bodies, tensor_headers = inference_bodies(model, inference_batch, 8, np.random.default_rng(seed_value))
+    # Warm-up and measured runs reuse request indices; the suffix must never repeat
+    query_counter = itertools.count()
+
+    async def search(client, i):
+        ident = searchable[i % len(searchable)]
+        query = ident.query_image if repeat_queries else unique_query(ident.query_image, next(query_counter))
+        return await client.post(f"{API}/users/search", files={"file": ("query.jpg", query, "image/jpeg")}, headers=auth)
+
+    def search_hit(response, i):
+        body = response.json()
+        return body.get("search_result") and (body.get("user") or {}).get("name") == searchable[i % len(searchable)].name
+
+    async def inference(client, i):
+        return await client.post(f"{API}/face/inference", content=bodies[i % len(bodies)], headers=tensor_headers)
+
+    def image_route(route):
+        async def send(client, i):
+            return await client.get(f"{API}/users/{route}/{searchable[i % len(searchable)].identity_id}", headers=auth)
+        return send
+
+    return {
+        "search": (search, search_hit),
+        "inference": (inference, None),
+        "face_image": (image_route("face-image"), None),
+        "face_preprocessed_image": (image_route("face-preprocessed-image"), None),
+    }
+
+
+@asynccontextmanager
+async def open_client(args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            yield client, args.username, args.password
+        return
+
+    with tempfile.TemporaryDirectory(prefix="load_test_") as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp) / 'load_test.db'}"
+        os.environ["FACE_IMAGE_DIR"] = str(Path(tmp) / "face_images")
+        os.environ["GALLERY_SNAPSHOT_DIR"] = str(Path(tmp) / "gallery_snapshot")
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "true" if args.embedding_cache else "false"
+        os.chdir(SERVER_DIR)
+        sys.path.insert(0, str(SERVER_DIR))
+        import main
+        from app.core.config import settings
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+                yield client, settings.SUPERUSER_ID, settings.SUPERUSER_PASSWORD
+
+
+async def run(args) -> dict:
+    identities = load_identities(args.dataset, args.identities, args.name_prefix, args.seed)
+    random.Random(args.seed).shuffle(identities)
+
+    async with open_client(args) as (client, username, password):
+        auth = await login(client, username, password)
+        health = (await client.get("/health")).json()
+        print(f"--- {'in-process' if args.in_process else args.base_url} | 모델 {health.get('model', {}).get('model_path')} "
+              f"({health.get('model', {}).get('input_format')}) ---")
+
+        seeding = await seed(client, auth, identities, args.seed_chunk)
+        print(f"등록: {seeding['registered']}명 신규, {seeding['already_registered']}명 기존, {seeding['failed']}명 실패 "
+              f"({seeding['registrations_per_second']}/s)")
+
+        scenarios = build_scenarios(
+            identities, auth, health.get("model", {}), args.inference_batch, args.seed, args.embedding_cache
+        )
+        cache = health.get("embedding_cache", {})
+        print(f"임베딩 캐시: {'켜짐' if cache.get('enabled') else '꺼짐'}, "
+              f"쿼리 {'반복 (캐시 경로 측정)' if args.embedding_cache else '요청마다 고유'}")
+        results = {}
+        print(f"\n{'scenario':<24} {'conc':>4} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>5} "
+              f"{'cache':>6}  stages (p50 ms)")
+        for name in args.scenarios:
+            send, check = scenarios[name]
+            results[name] = {}
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await run_load(client, send, None, args.warmup, min(concurrency, args.warmup))
+                before = await cache_counters(client)
+                result = await run_load(client, send, check, args.requests, concurrency)
+                result["embedding_cache"] = cache_delta(before, await cache_counters(client))
+                results[name][str(concurrency)] = result
+                latency = result["latency"]
+                stages = " ".join(f"{stage}={values['p50_ms']}" for stage, values in result["stages"].items())
+                if "check_pass_rate" in result:
+                    stages = f"{stages} top1={result['check_pass_rate']:.3f}".strip()
+                hit_rate = result["embedding_cache"]["hit_rate"]
+                cache_column = f"{hit_rate * 100:.0f}%" if hit_rate is not None else "-"
+                print(f"{name:<24} {concurrency:>4} {result['throughput_rps']:>9.1f} {latency.get('p50_ms', 0):>9.2f} "
+                      f"{latency.get('p95_ms', 0):>9.2f} {latency.get('p99_ms', 0):>9.2f} {result['errors']:>5} "
+                      f"{cache_column:>6}  {stages}")
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "target": "in-process" if args.in_process else args.base_url,
+            "dataset": args.dataset,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "inference_batch": args.inference_batch,
+            "embedding_cache": health.get("embedding_cache", {}).get("enabled"),
+            "repeat_queries": args.embedding_cache,
+            "model": health.get("model"),
+        },
+        "seed": seeding,
+        "scenarios": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Prints throughput / p50 / p99 changes for every scenario and concurrency present in both reports."""
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    print(f"--- {old_path} ({old['meta'].get('git_commit')}) -> {new_path} ({new['meta'].get('git_commit')}) ---")
+    print(f"{'scenario':<24} {'conc':>4} {'req/s':>20} {'p50 ms':>20} {'p99 ms':>20}")
+
+    def delta(before, after):
+        change = (after - before) / before * 100 if before else 0.0
+        return f"{before:.1f}->{after:.1f} ({change:+.0f}%)"
+
+    for name, levels in new["scenarios"].items():
+        for concurrency, result in levels.items():
+            previous = old["scenarios"].get(name, {}).get(concurrency)
+            if previous is None:
+                continue
+            print(f"{name:<24} {concurrency:>4} "
+                  f"{delta(previous['throughput_rps'], result['throughput_rps']):>20} "
+                  f"{delta(previous['latency']['p50_ms'], result['latency']['p50_ms']):>20} "
+                  f"{delta(previous['latency']['p99_ms'], result['latency']['p99_ms']):>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="인식 API 부하 테스트 (등록 -> 검색 / 추론 / 얼굴 이미지)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="앱을 인프로세스로 띄워 임시 SQLite DB 로 측정")
+    parser.add_argument("--username", default=os.environ.get("SUPERUSER_ID"))
+    parser.add_argument("--password", default=os.environ.get("SUPERUSER_PASSWORD"))
+    parser.add_argument("--dataset", default=None, help="LFW 인물별 폴더 (생략 시 합성 이미지)")
+    parser.add_argument("--identities", type=int, default=100, help="등록할 인물 수 (기본 100)")
+    parser.add_argument("--name-prefix", default="loadtest_")
+    parser.add_argument("--seed-chunk", type=int, default=100, help="대량 등록 요청당 인물 수")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="시나리오·동시성 수준별 요청 수")
+    parser.add_argument("--warmup", type=int, default=10, help="측정 전 버리는 요청 수")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="같은 쿼리 바이트를 반복 전송하고 --in-process 에서 캐시를 켬 (캐시 경로 측정용)")
+    parser.add_argument("--inference-batch", type=int, default=1, help="/face/inference 텐서 배치 크기")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="두 결과 JSON 비교만 수행")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.output:
+        # --in-process changes into server/ before the app is imported
+        args.output = str(Path(args.output).resolve())
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        raise SystemExit("httpx 패키지가 필요합니다: pip install httpx")
+    if not args.in_process and not (args.username and args.password):
+        raise SystemExit("--username / --password (또는 SUPERUSER_ID / SUPERUSER_PASSWORD) 가 필요합니다.")
+
+    report = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\nJSON 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+고정 배치(예: [1, 3, 112, 112])로 export 된 임베딩 ONNX 모델의 배치 축을 동적("N")으로 바꿔 저장하는 스크립트.
+ModelService 는 고정 배치 모델도 청크 단위로 실행하지만, 동적 배치 모델이어야 한 번의 session.run 으로 배치 추론이 가능합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/make_batch_dynamic.py
+    python scripts/make_batch_dynamic.py --src models/face.onnx --dest models/face_dynamic.onnx
+
+onnx 패키지가 필요합니다 (pip install onnx).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import onnxruntime as ort
+
+from app.core.config import settings
+
+
+def make_batch_dynamic(src: Path, dest: Path, dim_name: str = "N") -> None:
+    import onnx
+
+    model = onnx.load(str(src))
+    graph = model.graph
+    initializer_names = {init.name for init in graph.initializer}
+
+    for value in list(graph.input) + list(graph.output):
+        if value.name in initializer_names:
+            continue
+        dims = value.type.tensor_type.shape.dim
+        if not dims:
+            continue
+        before = dims[0].dim_value if dims[0].HasField("dim_value") else dims[0].dim_param
+        dims[0].dim_param = dim_name
+        print(f"  {value.name}: batch 축 {before} -> {dim_name}")
+
+    # Drop stale intermediate shapes so ORT re-infers them with the symbolic batch axis
+    del graph.value_info[:]
+    onnx.checker.check_model(model)
+    onnx.save(model, str(dest))
+
+
+def verify(dest: Path, batch: int = 4) -> None:
+    session = ort.InferenceSession(str(dest), providers=["CPUExecutionProvider"])
+    model_input = session.get_inputs()[0]
+    shape = [batch] + [d if isinstance(d, int) else 1 for d in model_input.shape[1:]]
+    dummy = np.random.randn(*shape).astype(np.float32)
+    out = session.run(None, {model_input.name: dummy})[0]
+    print(f"검증: 입력 {shape} -> 출력 {out.shape}")
+    if out.shape[0] != batch:
+        raise RuntimeError(
+            "배치 축이 그래프 내부(Reshape 등)에 고정되어 있습니다. 원본 프레임워크에서 dynamic_axes 로 재-export 하세요."
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX 모델 배치 축을 동적으로 변환")
+    parser.add_argument("--src", default=settings.MODEL_PATH, help="원본 모델 경로 (기본: env MODEL_PATH)")
+    parser.add_argument("--dest", default=None, help="저장 경로 (기본: <src>_dynamic.onnx)")
+    args = parser.parse_args()
+
+    src = Path(args.src)
+    dest = Path(args.dest) if args.dest else src.with_name(f"{src.stem}_dynamic{src.suffix}")
+
+    try:
+        make_batch_dynamic(src, dest)
+    except ImportError:
+        print("onnx 패키지가 필요합니다: pip install onnx")
+        return
+    verify(dest)
+    print(f"\n완료: {dest} (MODEL_PATH 로 지정해 사용)")
+
+
+if __name__ == "__main__":
+    main()
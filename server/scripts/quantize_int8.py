@@ -0,0 +1,126 @@
+"""
+임베딩 모델(MODEL_PATH)을 INT8 정적 양자화(static quantization)하는 스크립트.
+copy_lfw_selected.py 로 만든 LFW 폴더의 이미지를 서버와 같은 전처리(pre_process: 검출 + 정렬 + 정규화)로 변환해
+활성값 범위를 보정(calibration)한 뒤, 양자화된 모델을 저장합니다.
+
+사용법 (server/ 에서 실행):
+    python scripts/quantize_int8.py --dataset ./lfw_selected
+    python scripts/quantize_int8.py --dataset ./lfw_selected --calib-images 500 --per-channel --calibration percentile
+    python scripts/quantize_int8.py --dataset ./lfw_selected --format qoperator --output ./models/arcface.int8.onnx
+
+결과 모델은 MODEL_PRECISION=int8 로 서빙합니다 (경로 기본값: MODEL_PATH 옆 <이름>.int8.onnx, INT8_MODEL_PATH 로 변경).
+float 모델과의 처리량 / 지연시간 / 검증 정확도 비교는 scripts/benchmark_quantized.py 로 확인합니다.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Ensure app is importable when run from server/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from app.core.config import settings
+from app.services.ai_service import int8_model_path
+from app.utils.preprocessing import pre_process
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+class LFWCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed LFW faces one at a time, exactly as the server would embed them."""
+
+    def __init__(self, image_paths, input_name: str):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self._index = 0
+        self.used = 0
+
+    def get_next(self):
+        while self._index < len(self.image_paths):
+            path = self.image_paths[self._index]
+            self._index += 1
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            self.used += 1
+            return {self.input_name: pre_process(image)}
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 모델 INT8 정적 양자화 (LFW 보정)")
+    parser.add_argument("--model", default=settings.MODEL_PATH, help="float 모델 경로 (기본 MODEL_PATH)")
+    parser.add_argument("--output", default=None, help="INT8 모델 저장 경로 (기본 INT8_MODEL_PATH 또는 <모델>.int8.onnx)")
+    parser.add_argument("--dataset", default="./lfw_selected", help="보정용 LFW 인물별 폴더 (기본 ./lfw_selected)")
+    parser.add_argument("--calib-images", type=int, default=300, help="보정에 쓸 이미지 수 (기본 300)")
+    parser.add_argument("--calibration", choices=list(CALIBRATION_METHODS), default="minmax")
+    parser.add_argument("--format", choices=["qdq", "qoperator"], default="qdq",
+                        help="qdq: QuantizeLinear/DequantizeLinear 쌍 (x86 CPU 권장), qoperator: QLinear* 연산자")
+    parser.add_argument("--per-channel", action="store_true", help="가중치 채널별 양자화 (정확도 ↑, 크기 약간 ↑)")
+    parser.add_argument("--skip-preprocess", action="store_true", help="quant_pre_process(shape 추론·그래프 정리) 생략")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    output = Path(args.output or int8_model_path())
+    image_paths = sorted(Path(args.dataset).rglob("*.jpg"))
+    if not image_paths:
+        raise SystemExit(f"보정 이미지가 없습니다: {args.dataset} (copy_lfw_selected.py 결과 폴더를 지정하세요)")
+    random.Random(args.seed).shuffle(image_paths)
+    image_paths = image_paths[:args.calib_images]
+
+    input_name = ort.InferenceSession(args.model, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    print(f"--- 모델 {args.model} -> {output} ---")
+    print(f"보정 이미지 {len(image_paths)}장, {args.calibration}, {args.format}, per_channel={args.per_channel}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_input = args.model
+        if not args.skip_preprocess:
+            prepared = str(Path(tmp) / "prepared.onnx")
+            try:
+                # Symbolic shape inference only matters for transformer-style dynamic shapes
+                quant_pre_process(args.model, prepared, skip_symbolic_shape=True)
+                model_input = prepared
+            except Exception as e:
+                print(f"quant_pre_process 실패, 원본 모델로 진행: {e}")
+
+        reader = LFWCalibrationReader(image_paths, input_name)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        quantize_static(
+            model_input,
+            str(output),
+            reader,
+            quant_format=QuantFormat.QDQ if args.format == "qdq" else QuantFormat.QOperator,
+            activation_type=QuantType.QInt8 if args.format == "qdq" else QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=args.per_channel,
+            calibrate_method=CALIBRATION_METHODS[args.calibration],
+        )
+        elapsed = time.perf_counter() - start
+
+    float_mb = Path(args.model).stat().st_size / 2**20
+    int8_mb = output.stat().st_size / 2**20
+    print(f"\n완료 ({elapsed:.1f}s, 보정에 사용된 이미지 {reader.used}장)")
+    print(f"모델 크기: float {float_mb:.1f} MiB -> int8 {int8_mb:.1f} MiB ({float_mb / max(int8_mb, 1e-9):.1f}x)")
+    print(f"\n비교: python scripts/benchmark_quantized.py --dataset {args.dataset} --int8 {output}")
+    print("서빙: MODEL_PRECISION=int8" + (f" INT8_MODEL_PATH={output}" if str(output) != int8_model_path() else ""))
+
+
+if __name__ == "__main__":
+    main()